@@ -0,0 +1,154 @@
+"""
+Local fake Ollama server for load tests.
+
+Speaks enough of the Ollama HTTP API for the agents: `POST /api/chat`
+(streaming NDJSON and non-streaming, `format: "json"`), plus `/api/tags`
+and `/api/version` for health checks.
+
+    python benchmarks/fake_ollama.py --port 11435 --latency 0.3 --tokens-per-sec 40
+    OLLAMA_HOST=http://localhost:11435 python src/api.py
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional
+
+
+class FakeOllamaConfig:
+    def __init__(self, latency: float = 0.2, tokens_per_sec: float = 50.0,
+                 answer_tokens: int = 120, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency                # Simulated prompt-eval time (seconds)
+        self.tokens_per_sec = tokens_per_sec  # Simulated generation speed
+        self.answer_tokens = answer_tokens    # Tokens per answer
+        self.error_rate = error_rate          # Fraction of requests answered with HTTP 500
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _answer_tokens(n: int, json_mode: bool):
+    if json_mode:
+        body = json.dumps({
+            "markdown_report": "## 🎯 TL;DR\n" + " ".join(["insight"] * n),
+            "suggested_questions": ["What dataset is used?", "How is it evaluated?", "What are the limits?"],
+        })
+        # Stream JSON in small slices so concatenation stays valid
+        return [body[i:i + 8] for i in range(0, len(body), 8)]
+    return [("token" if i else "Token") + " " for i in range(n)]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOllama/0.1"
+    protocol_version = "HTTP/1.1"
+    config: FakeOllamaConfig = FakeOllamaConfig()
+
+    def log_message(self, format, *args):
+        pass  # Keep load tests quiet
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "fake:latest"}]})
+        elif self.path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-fake"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        conf = self.config
+
+        if conf.should_fail():
+            self._send_json(500, {"error": "fake ollama: injected failure"})
+            return
+
+        prompt_chars = sum(len(m.get("content", "")) for m in request.get("messages", []))
+        prompt_eval_count = max(1, prompt_chars // 4)
+        tokens = _answer_tokens(conf.answer_tokens, request.get("format") == "json")
+        per_token = 1.0 / conf.tokens_per_sec if conf.tokens_per_sec > 0 else 0.0
+        started = time.perf_counter()
+        time.sleep(conf.latency)
+
+        base = {"model": request.get("model", "fake"), "created_at": _now()}
+        stats = {
+            "done": True,
+            "prompt_eval_count": prompt_eval_count,
+            "prompt_eval_duration": int(conf.latency * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(len(tokens) * per_token * 1e9),
+            "load_duration": 0,
+        }
+
+        if request.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                time.sleep(per_token)
+                self._write_chunk({**base, "message": {"role": "assistant", "content": token}, "done": False})
+            stats["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            self._write_chunk({**base, "message": {"role": "assistant", "content": ""}, **stats})
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            time.sleep(per_token * len(tokens))
+            stats["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            self._send_json(200, {**base, "message": {"role": "assistant", "content": "".join(tokens)}, **stats})
+
+    def _write_chunk(self, payload: Dict[str, Any]):
+        line = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+
+def start_server(host: str = "127.0.0.1", port: int = 11435,
+                 config: Optional[FakeOllamaConfig] = None) -> ThreadingHTTPServer:
+    """Start the fake server on a daemon thread and return it (call `.shutdown()` to stop)."""
+    handler = type("ConfiguredHandler", (FakeOllamaHandler,), {"config": config or FakeOllamaConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2, help="Prompt-eval delay in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, FakeOllamaConfig(
+        args.latency, args.tokens_per_sec, args.answer_tokens, args.error_rate
+    ))
+    print(f"🦙 Fake Ollama listening on http://{args.host}:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
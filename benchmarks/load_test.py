@@ -0,0 +1,202 @@
+"""
+End-to-end load test for the API.
+
+Drives /api/chat, /api/summarize, /api/review, /api/papers and /api/bookmark
+with a weighted request mix at increasing concurrency and reports throughput,
+latency percentiles and errors per level.
+
+    # Against a running API (pointed at a real or fake Ollama):
+    python benchmarks/load_test.py --api-url http://localhost:8001 --concurrency 1 4 16
+
+    # Self-contained: start the fake Ollama and the API, then load them
+    python benchmarks/load_test.py --spawn --latency 0.3 --tokens-per-sec 40
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+import numpy as np
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ollama import start_server, FakeOllamaConfig
+
+# Relative weights of a "realistic" interactive session mix
+DEFAULT_MIX = {"papers": 25, "chat": 40, "summarize": 15, "review": 10, "bookmark": 10}
+
+QUESTIONS = [
+    "What dataset do they use?",
+    "Which datasets are used?",
+    "What is the main contribution?",
+    "How does the method compare to the baselines?",
+    "What are the limitations?",
+]
+
+
+class LoadGenerator:
+    def __init__(self, api_url: str, papers: List[Dict], mix: Dict[str, int], seed: int = 0):
+        self.api_url = api_url.rstrip("/")
+        self.papers = papers
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _pick(self):
+        with self.rng_lock:
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            paper = self.rng.choice(self.papers)
+            question = self.rng.choice(QUESTIONS)
+        return kind, paper, question
+
+    def request_once(self) -> Dict[str, Any]:
+        kind, paper, question = self._pick()
+        session = self._session()
+        url = self.api_url
+        start = time.perf_counter()
+        try:
+            if kind == "papers":
+                r = session.get(f"{url}/api/papers", timeout=300)
+            elif kind == "chat":
+                r = session.post(f"{url}/api/chat", timeout=300, json={
+                    "paper_id": paper['id'], "paper_title": paper['title'], "query": question})
+            elif kind == "summarize":
+                r = session.post(f"{url}/api/summarize", timeout=300, json={
+                    "paper_id": paper['id'], "mode": "quick_summary"})
+            elif kind == "review":
+                r = session.post(f"{url}/api/review", timeout=300, json={"paper_title": paper['title']})
+            else:
+                r = session.post(f"{url}/api/bookmark", timeout=300, json={
+                    "paper_id": paper['id'], "title": paper['title']})
+            ok = r.status_code < 400
+            status = r.status_code
+        except requests.RequestException as e:
+            ok, status = False, type(e).__name__
+        return {"kind": kind, "latency": time.perf_counter() - start, "ok": ok, "status": status}
+
+    def run_level(self, concurrency: int, requests_per_level: int) -> Dict[str, Any]:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(lambda _: self.request_once(), range(requests_per_level)))
+        elapsed = time.perf_counter() - start
+        return summarize_level(concurrency, samples, elapsed)
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {"p50_ms": 0.0, "p90_ms": 0.0, "p99_ms": 0.0}
+    ms = np.array(latencies) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(ms, q)), 1) for q in (50, 90, 99)}
+
+
+def summarize_level(concurrency: int, samples: List[Dict], elapsed: float) -> Dict[str, Any]:
+    by_kind = {}
+    for kind in sorted({s["kind"] for s in samples}):
+        subset = [s for s in samples if s["kind"] == kind]
+        by_kind[kind] = {
+            "requests": len(subset),
+            "errors": sum(not s["ok"] for s in subset),
+            **_percentiles([s["latency"] for s in subset if s["ok"]]),
+        }
+    errors = [s for s in samples if not s["ok"]]
+    statuses: Dict[str, int] = {}
+    for s in errors:
+        statuses[str(s["status"])] = statuses.get(str(s["status"]), 0) + 1
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "errors": len(errors),
+        "error_statuses": statuses,
+        **_percentiles([s["latency"] for s in samples if s["ok"]]),
+        "endpoints": by_kind,
+    }
+
+
+def print_level(level: Dict[str, Any]):
+    print(f"\n=== concurrency {level['concurrency']}: {level['throughput_rps']} req/s, "
+          f"p50 {level['p50_ms']}ms, p99 {level['p99_ms']}ms, errors {level['errors']} {level['error_statuses']}")
+    print(f"  {'endpoint':<10} {'reqs':>5} {'errs':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    for kind, s in level["endpoints"].items():
+        print(f"  {kind:<10} {s['requests']:>5} {s['errors']:>5} {s['p50_ms']:>9.1f} {s['p90_ms']:>9.1f} {s['p99_ms']:>9.1f}")
+
+
+def _wait_ready(api_url: str, timeout: float = 300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{api_url}/api/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    raise RuntimeError(f"API at {api_url} did not become ready within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API with a request mix")
+    parser.add_argument("--api-url", default="http://localhost:8001")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--mix", type=json.loads, default=DEFAULT_MIX,
+                        help='Endpoint weights as JSON, e.g. \'{"chat": 1, "papers": 1}\'')
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--spawn", action="store_true", help="Start a fake Ollama and the API locally")
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake, api_process = None, None
+    if args.spawn:
+        fake = start_server(port=args.ollama_port, config=FakeOllamaConfig(
+            args.latency, args.tokens_per_sec, error_rate=args.error_rate))
+        env = {**os.environ, "OLLAMA_HOST": f"http://127.0.0.1:{args.ollama_port}"}
+        api_process = subprocess.Popen([sys.executable, "src/api.py"], cwd=ROOT, env=env)
+
+    try:
+        _wait_ready(args.api_url)
+        papers = requests.get(f"{args.api_url}/api/papers", timeout=30).json()
+        if not papers:
+            print("❌ No papers served by /api/papers. Run the pipeline (or the synthetic corpus) first.")
+            return 1
+
+        generator = LoadGenerator(args.api_url, papers, args.mix)
+        levels = []
+        for concurrency in args.concurrency:
+            level = generator.run_level(concurrency, args.requests)
+            print_level(level)
+            levels.append(level)
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({"mix": args.mix, "levels": levels}, f, indent=2)
+            print(f"\n💾 Results saved to {args.output}")
+        return 0
+    finally:
+        if api_process:
+            api_process.terminate()
+            api_process.wait()
+        if fake:
+            fake.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+"""
+Stage-level benchmark suite.
+
+Generates a synthetic corpus, runs every pipeline stage against it with a
+stub LLM, and reports throughput, latency percentiles and peak RSS per stage
+(the highest current RSS sampled while that stage's calls ran). The suite
+runs `--repeat` times and each stage reports its best run.
+
+    python benchmarks/run_benchmarks.py --papers 20 --pages 8
+    python benchmarks/run_benchmarks.py --save-baseline
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+
+Exits with status 1 when a gated stage (`--gate`, default parser, vector and
+prompt) regresses past `--tolerance` vs the baseline. The db stages take about
+a millisecond per call, which is within run-to-run noise, so they are reported
+but do not affect the exit code unless they are gated explicitly.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import threading
+import numpy as np
+from typing import Dict, Any, List, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_corpus import generate_corpus, WORDS
+from stub_llm import StubLLM
+
+STAGE_GROUPS = ["parser", "vector", "db", "prompt"]
+GATED_GROUPS = ["parser", "vector", "prompt"]
+REFERENCE_STAGE = "reference.pdf_text"
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def _current_rss_mb() -> float:
+    """Current resident set size (Linux /proc); elsewhere falls back to the lifetime peak."""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RssSampler:
+    """Background thread keeping a resettable high-water mark of the current RSS."""
+    def __init__(self, interval_s: float = 0.005):
+        self.interval_s = interval_s
+        self.high = _current_rss_mb()
+        thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            self.high = max(self.high, _current_rss_mb())
+            time.sleep(self.interval_s)
+
+    def reset(self):
+        self.high = _current_rss_mb()
+
+    def peak(self) -> float:
+        return max(self.high, _current_rss_mb())
+
+
+class Recorder:
+    """Collects per-call latencies, processed units and peak RSS for each stage."""
+    def __init__(self, rss: "RssSampler" = None):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.rss = rss or RssSampler()
+
+    def time(self, stage: str, fn: Callable, *args, units: int = 1, **kwargs):
+        self.rss.reset()
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        entry = self.stages.setdefault(stage, {"latencies": [], "units": 0, "peak_rss_mb": 0.0})
+        entry["latencies"].append(elapsed)
+        entry["units"] += units(result) if callable(units) else units
+        entry["peak_rss_mb"] = max(entry["peak_rss_mb"], self.rss.peak())
+        return result
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for stage, entry in self.stages.items():
+            latencies = np.array(entry["latencies"]) * 1000
+            total_s = float(latencies.sum()) / 1000
+            report[stage] = {
+                "calls": len(latencies),
+                "units": entry["units"],
+                "total_s": round(total_s, 4),
+                "throughput": round(entry["units"] / total_s, 2) if total_s else 0.0,
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p90_ms": round(float(np.percentile(latencies, 90)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                "peak_rss_mb": round(entry["peak_rss_mb"], 1),
+            }
+        return report
+
+
+# --- Stages ---
+
+def _reference_extract(pdf_path: str) -> str:
+    """Plain in-process PyMuPDF extraction: no project code, so only the machine changes its speed."""
+    import fitz
+
+    with fitz.open(pdf_path) as doc:
+        return "".join(page.get_text() for page in doc)
+
+
+def bench_parser(rec: Recorder, config_path: str):
+    from agents.parser_agent import ParserAgent
+    from parse_sandbox import ParseSandbox
+
+    agent = ParserAgent(config_path)
+    agent._timings = []
+    # Same extraction path as run(): the sandbox worker when isolation is on (start-up timed on its own)
+    if agent.isolation.get('enabled', False):
+        agent._sandbox = ParseSandbox.from_config(agent.isolation)
+        rec.time("parser.sandbox_start", agent._sandbox._start)
+    try:
+        for paper in agent._load_metadata():
+            # Machine-speed reference, interleaved with the measured path (see compare())
+            rec.time(REFERENCE_STAGE, _reference_extract, paper['local_pdf_path'])
+            raw = rec.time("parser.read_pdf", agent._read_pdf, paper['local_pdf_path'], paper['id'])
+            raw = agent.remove_references(raw)
+            cleaned = rec.time("parser.clean_text", agent.clean_text, raw)
+            rec.time("parser.chunk_text", agent.chunk_text, cleaned, units=len)
+    finally:
+        if agent._sandbox is not None:
+            agent._sandbox.close()
+            agent._sandbox = None
+
+    # Produce parsed_papers.json for the later stages
+    rec.time("parser.run", agent.run)
+
+
+def bench_vector(rec: Recorder, config_path: str, queries: List[str]):
+    from agents import vector_agent
+    from agents.vector_agent import VectorAgent
+
+    vector_agent._MODEL_CACHE.clear()  # Cold load in every repeat
+    agent = VectorAgent(config_path)
+    rec.time("vector.model_load", lambda: agent.model)
+    total_chunks = sum(p['total_chunks'] for p in agent._load_parsed_data())
+    rec.time("vector.create_index", agent.create_index, units=total_chunks)
+    for query in queries:
+        rec.time("vector.search", agent.search, query, top_k=5)
+
+
+def bench_db(rec: Recorder, workspace: str, iterations: int):
+    import database
+
+    database.DB_PATH = os.path.join(workspace, "data", "user_library.db")
+    if getattr(database._local, "search_conn", None) is not None:
+        database._local.search_conn.close()  # Still open on the previous repeat's database
+        database._local.search_conn = None
+    rec.time("db.init_db", database.init_db)
+    for i in range(iterations):
+        paper_id = f"9901.{i % 50:05d}v1"
+        rec.time("db.toggle_bookmark", database.toggle_bookmark, paper_id, "Title")
+        rec.time("db.get_all_bookmarks", database.get_all_bookmarks)
+        rec.time("db.add_chat_message", database.add_chat_message, paper_id, "user", "question " * 40)
+        rec.time("db.get_chat_history", database.get_chat_history, paper_id)
+
+    rec.time("db.sync_papers", database.sync_papers_from_metadata,
+             os.path.join(workspace, "data", "metadata.json"))
+    for i in range(iterations):
+        word = WORDS[i % len(WORDS)]
+        rec.time("db.search_papers", database.search_papers, f"{WORDS[(i * 7) % len(WORDS)]} {word[:3]}")
+
+
+def bench_prompt(rec: Recorder, config_path: str, queries: List[str]):
+    from agents.summarizer_agent import SummarizerAgent
+    from agents.chat_agent import ChatAgent
+    from agents.reviewer_agent import ReviewerAgent
+
+    stub = StubLLM().install()
+    summarizer, chat, reviewer = SummarizerAgent(config_path), ChatAgent(config_path), ReviewerAgent(config_path)
+    papers = summarizer._load_metadata()
+    history = [{"role": "user", "content": "question " * 40},
+               {"role": "assistant", "content": "answer " * 200}] * 3
+
+    for i, query in enumerate(queries):
+        paper = papers[i % len(papers)]
+        rec.time("prompt.summarize", summarizer.generate_summary, paper['id'], mode="quick_summary")
+        rec.time("prompt.chat", chat.chat, paper['id'], paper['title'], query, history)
+        rec.time("prompt.review", reviewer.review, paper['title'])
+
+    return {"mean": int(np.mean(stub.prompt_chars)), "max": int(np.max(stub.prompt_chars))}
+
+
+# --- Reporting ---
+
+def best_of(runs: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """Per stage, the repeat with the lowest p50: scheduler and cache noise only ever adds time."""
+    best = {}
+    for stages in runs:
+        for stage, entry in stages.items():
+            if stage not in best or entry["p50_ms"] < best[stage]["p50_ms"]:
+                best[stage] = entry
+    return best
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2,
+            min_ms: float = 2.0, min_calls: int = 3) -> List[str]:
+    """Return human-readable regressions of `current` against `baseline`.
+
+    Latency of stages whose baseline p50 is under `min_ms`, or that ran fewer
+    than `min_calls` times, is too noisy to gate on (their RSS still is).
+    Throughput is only gated for batch stages (several units per call); for
+    the others it is the mean of the same latencies, and one slow call moves it.
+    When the reference stage (project-free work timed alongside the parser)
+    is slower than in the baseline, the machine is, and the limits are scaled
+    by the same factor.
+    """
+    slowdown = 1.0
+    ref_cur, ref_base = current["stages"].get(REFERENCE_STAGE), baseline.get("stages", {}).get(REFERENCE_STAGE)
+    if ref_cur and ref_base and ref_base["p50_ms"]:
+        slowdown = max(1.0, ref_cur["p50_ms"] / ref_base["p50_ms"])
+    regressions = []
+    for stage, cur in current["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base or stage == REFERENCE_STAGE:
+            continue
+        if cur["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{stage}: peak RSS {base['peak_rss_mb']}MB -> {cur['peak_rss_mb']}MB")
+        if base["p50_ms"] < min_ms or base["calls"] < min_calls:
+            continue
+        if base["p50_ms"] and cur["p50_ms"] > base["p50_ms"] * slowdown * (1 + tolerance):
+            regressions.append(f"{stage}: p50 {base['p50_ms']}ms -> {cur['p50_ms']}ms")
+        batch = base["units"] > base["calls"]
+        if batch and base["throughput"] and cur["throughput"] < base["throughput"] / slowdown * (1 - tolerance):
+            regressions.append(f"{stage}: throughput {base['throughput']} -> {cur['throughput']}/s")
+    return regressions
+
+
+def print_report(stages: Dict[str, Dict[str, float]]):
+    print(f"\n{'stage':<24} {'calls':>6} {'units/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'RSS MB':>8}")
+    for stage, s in stages.items():
+        print(f"{stage:<24} {s['calls']:>6} {s['throughput']:>10.1f} {s['p50_ms']:>9.2f} "
+              f"{s['p90_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['peak_rss_mb']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the stage-level benchmark suite")
+    parser.add_argument("--papers", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--db-iterations", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="Run the suite N times and keep each stage's best run")
+    parser.add_argument("--stages", nargs="+", choices=STAGE_GROUPS, default=STAGE_GROUPS)
+    parser.add_argument("--workspace", help="Reuse a corpus directory instead of a temp dir")
+    parser.add_argument("--output", help="Where to write the results JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown (0.2 = 20%%)")
+    parser.add_argument("--min-ms", type=float, default=2.0, help="Ignore latency of stages faster than this")
+    parser.add_argument("--min-calls", type=int, default=3, help="Ignore latency of stages with fewer calls")
+    parser.add_argument("--gate", nargs="+", choices=STAGE_GROUPS, default=GATED_GROUPS,
+                        help="Stage groups whose regressions fail the run (others are only reported)")
+    args = parser.parse_args()
+
+    workspace = args.workspace or tempfile.mkdtemp(prefix="arxiv_bench_")
+
+    rng = random.Random(1)
+    queries = [" ".join(rng.choice(WORDS) for _ in range(6)) for _ in range(args.queries)]
+
+    rss = RssSampler()
+    runs = []
+    prompt_chars = None
+    for run in range(max(1, args.repeat)):
+        # Parsing moves PDFs into the document store: every repeat gets its own (identical) corpus
+        run_dir = os.path.join(workspace, f"run-{run}")
+        print(f"📦 Generating {args.papers} synthetic papers in {run_dir}...")
+        config_path = generate_corpus(run_dir, args.papers, args.pages,
+                                      base_config=os.path.join(ROOT, "config.yaml"))
+        rec = Recorder(rss)
+        if "parser" in args.stages:
+            bench_parser(rec, config_path)
+        if "vector" in args.stages:
+            bench_vector(rec, config_path, queries)
+        if "db" in args.stages:
+            bench_db(rec, run_dir, args.db_iterations)
+        if "prompt" in args.stages:
+            prompt_chars = bench_prompt(rec, config_path, queries)
+        runs.append(rec.summary())
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "workspace")},
+        "stages": best_of(runs),
+        "prompt_size_chars": prompt_chars,
+    }
+    print_report(results["stages"])
+    if prompt_chars:
+        print(f"\n📝 Prompt size: mean {prompt_chars['mean']} chars, max {prompt_chars['max']} chars")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("ℹ️  No baseline found, skipping comparison (use --save-baseline).")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        regressions = compare(results, json.load(f), args.tolerance, args.min_ms, args.min_calls)
+    gated = [line for line in regressions if line.split(".", 1)[0] in args.gate]
+    if len(gated) < len(regressions):
+        print("\n⚠️  Slower than baseline (not gated):")
+        for line in regressions:
+            if line not in gated:
+                print(f"  - {line}")
+    if gated:
+        print("\n❌ Regressions vs baseline:")
+        for line in gated:
+            print(f"  - {line}")
+        return 1
+    print("\n✅ No regressions vs baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
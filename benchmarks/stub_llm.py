@@ -0,0 +1,42 @@
+import json
+import time
+from typing import List, Dict, Optional
+
+
+class StubLLM:
+    """
+    Drop-in replacement for `ollama.chat` that answers instantly (or after a
+    fixed delay) and records prompt sizes, so prompt assembly can be timed
+    without a running Ollama.
+    """
+    def __init__(self, delay: float = 0.0, answer_words: int = 120):
+        self.delay = delay
+        self.answer = " ".join(["lorem"] * answer_words)
+        self.prompt_chars: List[int] = []
+
+    def chat(self, model: str, messages: List[Dict], format: Optional[str] = None, **kwargs) -> Dict:
+        self.prompt_chars.append(sum(len(m['content']) for m in messages))
+        if self.delay:
+            time.sleep(self.delay)
+
+        if format == 'json':
+            content = json.dumps({
+                "markdown_report": f"## 🎯 TL;DR\n{self.answer}",
+                "suggested_questions": ["What dataset is used?", "How is it evaluated?", "What are the limits?"],
+            })
+        else:
+            content = self.answer
+
+        return {
+            "model": model,
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "prompt_eval_count": self.prompt_chars[-1] // 4,
+            "eval_count": len(content) // 4,
+        }
+
+    def install(self):
+        """Patch `ollama.chat` for the current process."""
+        import ollama
+        ollama.chat = self.chat
+        return self
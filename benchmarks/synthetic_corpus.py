@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import random
+import argparse
+import yaml
+from typing import List, Dict, Any
+
+WORDS = (
+    "agent agents model language large retrieval augmented generation planning memory tool "
+    "reward policy graph network transformer attention benchmark dataset evaluation accuracy "
+    "latency baseline ablation experiment method results propose framework system multi "
+    "coordination communication protocol reasoning task environment learning reinforcement "
+    "training inference context prompt token embedding vector search index query answer"
+).split()
+
+SECTIONS = ["Introduction", "Related Work", "Method", "Experiments", "Results", "Limitations", "Conclusion"]
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(3, 7)))
+
+
+def _write_pdf(path: str, title: str, pages: int, rng: random.Random):
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    rect = fitz.Rect(50, 50, 545, 790)
+    for page_no in range(pages):
+        page = doc.new_page()
+        lines = [title, "", "Abstract", _paragraph(rng)] if page_no == 0 else []
+        lines += [f"{(page_no % len(SECTIONS)) + 1} {SECTIONS[page_no % len(SECTIONS)]}"]
+        lines += [_paragraph(rng) for _ in range(4)]
+        if page_no == pages - 1:
+            lines += ["References", "[1] A. Author. A paper about agents. 2024."]
+        page.insert_textbox(rect, "\n".join(lines), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def generate_corpus(workspace: str, num_papers: int = 20, pages: int = 8,
+                    seed: int = 0, base_config: str = "config.yaml") -> str:
+    """
+    Create `num_papers` PDFs plus metadata.json under `workspace/data` and a
+    config.yaml pointing the agents at it. Returns the config path.
+    """
+    rng = random.Random(seed)
+    data_dir = os.path.join(workspace, "data")
+    with open(base_config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    pdf_dir = os.path.join(data_dir, config['data']['pdf_dir'])
+    os.makedirs(pdf_dir, exist_ok=True)
+
+    papers: List[Dict[str, Any]] = []
+    for i in range(num_papers):
+        paper_id = f"9901.{i:05d}v1"
+        title = " ".join(rng.choice(WORDS) for _ in range(6)).title()
+        pdf_path = os.path.join(pdf_dir, f"{paper_id}.pdf")
+        _write_pdf(pdf_path, title, pages, rng)
+        papers.append({
+            "id": paper_id,
+            "title": title,
+            "authors": [f"Author {rng.randint(1, 500)}" for _ in range(3)],
+            "primary_category": rng.choice(["cs.AI", "cs.CL", "cs.LG", "cs.MA"]),
+            "summary": _paragraph(rng),
+            "published": f"2025-{(i % 12) + 1:02d}-01 00:00:00+00:00",
+            "pdf_url": f"https://arxiv.org/pdf/{paper_id}",
+            "local_pdf_path": pdf_path,
+            "crawled_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    with open(os.path.join(data_dir, config['data']['metadata_file']), 'w', encoding='utf-8') as f:
+        json.dump(papers, f, ensure_ascii=False, indent=2)
+
+    config['data']['output_dir'] = data_dir
+    config_path = os.path.join(workspace, "config.yaml")
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, sort_keys=False, allow_unicode=True)
+    return config_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic arXiv-like PDF corpus")
+    parser.add_argument("workspace", help="Directory to create the corpus in")
+    parser.add_argument("--papers", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    path = generate_corpus(args.workspace, args.papers, args.pages, args.seed)
+    print(f"✅ Corpus written. Config: {path}")
@@ -28,7 +28,8 @@ const ChatModal = ({ paper, onClose }) => {
 
       try {
         const res = await api.post('/api/review', {
-          paper_title: paper.title
+          paper_title: paper.title,
+          paper_id: paper.id
         });
 
         const { markdown_report, suggested_questions } = res.data.response;
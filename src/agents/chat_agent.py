@@ -1,10 +1,13 @@
-import ollama
 from loguru import logger
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import yaml
 import os
 import json
 from agents.vector_agent import VectorAgent
+from semantic_cache import SemanticCache
+from llm_dispatch import get_dispatcher, QueueFullError
+from chat_memory import ConversationMemory
+import metrics
 
 class ChatAgent:
     """
@@ -14,17 +17,40 @@ class ChatAgent:
         self.config = self._load_config(config_path)
         self.vector_agent = VectorAgent(config_path)
         self.model = self.config['summarizer']['model_name'] # Reuse the same model
+        self.llm = get_dispatcher(self.config)
+
+        # Semantic cache for first-turn questions (near-duplicate questions per paper)
+        cache_config = self.config.get('chat', {}).get('semantic_cache', {})
+        self.answer_cache = SemanticCache.from_config(cache_config) if cache_config.get('enabled', False) else None
+
+        # Rolling summary + newest turns instead of a fixed window of raw messages
+        memory_config = self.config.get('chat', {}).get('memory', {})
+        self.memory = ConversationMemory.from_config(memory_config, self.llm, self.model) \
+            if memory_config.get('enabled', False) else None
         
     def _load_config(self, path: str) -> Dict:
         with open(path, 'r', encoding='utf-8') as f:
             return yaml.safe_load(f)
 
-    def chat(self, paper_id: str, paper_title: str, query: str, history: List[Dict]) -> str:
+    def chat(self, paper_id: str, paper_title: str, query: str, history: List[Dict], use_cache: bool = True,
+             summary: Optional[str] = None) -> str:
         """
         Generates a response based on paper context and chat history.
+        `summary` is the rolling summary of turns older than `history`.
+        First-turn questions may be answered from the semantic cache (`use_cache=False` opts out).
         """
         logger.info(f"💬 Chatting with paper {paper_id}: {query}")
 
+        # 0. Semantic cache: only first turns, later answers depend on the conversation
+        query_embedding = None
+        if self.answer_cache is not None and use_cache and not history and not summary:
+            query_embedding = self.vector_agent.encode([query], normalize=True)[0]
+            cached = self.answer_cache.lookup(paper_id, query_embedding)
+            metrics.inc("cache_requests_total", cache="chat_answer", result="hit" if cached else "miss")
+            if cached:
+                logger.info(f"⚡ Semantic cache hit ({cached['similarity']:.3f}): {cached['cached_query']}")
+                return {"content": cached['content'], "sources": cached['sources'], "cached": True}
+
         # 1. RAG Search: Find relevant chunks
         # We search globally but will filter for this specific paper in the prompt or logic
         # Ideally, VectorAgent should support filtering by ID, but for this prototype,
@@ -67,20 +93,34 @@ class ChatAgent:
         # 3. Construct Message History
         messages = [{'role': 'system', 'content': system_prompt}]
         
-        # Append recent history (limit to last 4 turns to save context window)
-        messages.extend(history[-4:])
+        if self.memory is not None:
+            # Rolling summary plus the newest turns that fit the token budget
+            messages.extend(self.memory.prompt_messages(summary, history))
+        else:
+            # Append recent history (limit to last 4 turns to save context window)
+            messages.extend({"role": m['role'], "content": m['content']} for m in history[-4:])
         
         # Append current user query
         messages.append({'role': 'user', 'content': query})
 
         # 4. Call LLM
         try:
-            response = ollama.chat(model=self.model, messages=messages)
-            return {
+            response = self.llm.chat(self.model, messages, priority="chat", agent="chat")
+            result = {
                 "content": response['message']['content'],
                 "sources": sources_data
             }
+            if query_embedding is not None:
+                self.answer_cache.store(paper_id, query, query_embedding, result)
+            return result
 
+        except QueueFullError:
+            raise
         except Exception as e:
             logger.error(f"Chat generation failed: {e}")
             return "I apologize, but I encountered an error generating the response."
+
+    def compact_memory(self, paper_id: str, paper_title: str):
+        """Fold older turns into the rolling summary; run after the response (BackgroundTasks)."""
+        if self.memory is not None:
+            self.memory.compact(paper_id, paper_title)
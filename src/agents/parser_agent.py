@@ -1,11 +1,15 @@
 import os
 import json
-import fitz  # PyMuPDF
+import time
 import yaml
 import re
 from loguru import logger
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from tqdm import tqdm
+from doc_store import DocumentStore
+from context_packs import detect_sections, build_packs
+from parse_sandbox import ParseSandbox, ParseQuarantine
+import metrics
 
 class ParserAgent:
     def __init__(self, config_path: str = "config.yaml"):
@@ -13,6 +17,21 @@ class ParserAgent:
         self.data_dir = self.config['data']['output_dir']
         self.metadata_path = os.path.join(self.data_dir, self.config['data']['metadata_file'])
         self.output_path = os.path.join(self.data_dir, self.config['parser']['output_file'])
+        self.packs_path = os.path.join(
+            self.data_dir, self.config['parser'].get('context_packs', {}).get('output_file', "context_packs.json")
+        )
+
+        # Content-addressed store for PDFs and extracted text (optional)
+        self.store = DocumentStore.from_config(self.config) if self.config.get('store', {}).get('enabled', False) else None
+
+        # Per-document isolation: PDFs are extracted in a worker process with time/memory limits
+        self.isolation = self.config['parser'].get('isolation', {})
+        self.quarantine = ParseQuarantine(os.path.join(
+            self.data_dir, self.isolation.get('quarantine_file', "parse_quarantine.json")
+        )) if self.isolation.get('enabled', False) else None
+        self.report_path = os.path.join(self.data_dir, self.config['parser'].get('report_file', "parse_report.json"))
+        self._sandbox: Optional[ParseSandbox] = None  # Open only during run()
+        self._timings: List[Dict] = []
         
         logger.info("🔬 Parser Agent initialized.")
 
@@ -75,6 +94,8 @@ class ParserAgent:
 
     def parse_pdf(self, file_path: str) -> str:
         """Extract full text using PyMuPDF"""
+        import fitz  # PyMuPDF (imported lazily, only needed for parsing)
+
         if not os.path.exists(file_path):
             logger.warning(f"⚠️ PDF not found: {file_path}")
             return ""
@@ -89,32 +110,210 @@ class ParserAgent:
             logger.error(f"❌ Failed to parse PDF {file_path}: {e}")
             return ""
 
-    def run(self):
+    def _read_pdf(self, pdf_path: str, paper_id: Optional[str]) -> str:
+        """Raw PDF text, extracted in the sandbox (with quarantine and cheap retry) during run()"""
+        if self._sandbox is None or paper_id is None:
+            started = time.perf_counter()
+            raw_text = self.parse_pdf(pdf_path)
+            self._record_timing(paper_id, time.perf_counter() - started, "full", "ok" if raw_text else "error")
+            return raw_text
+
+        if not pdf_path or not os.path.exists(pdf_path):
+            logger.warning(f"⚠️ PDF not found: {pdf_path}")
+            return ""
+
+        entry = self.quarantine.get(paper_id, pdf_path)
+        if entry is not None and entry['recovered'] is False:
+            logger.warning(f"🧯 Skipping quarantined paper {paper_id} ({entry['reason']}: {entry['detail']})")
+            return ""
+
+        # Quarantined papers go straight to the cheap mode
+        result = self._sandbox.extract(pdf_path, cheap=entry is not None)
+        if entry is not None:
+            self.quarantine.mark_recovered(paper_id, result.ok)
+        elif not result.ok:
+            logger.warning(f"🧯 Quarantined {paper_id}: {result.status} ({result.detail}); "
+                           f"retrying with the first {self._sandbox.cheap_pages} pages")
+            self.quarantine.add(paper_id, pdf_path, result)
+            first_seconds = result.seconds
+            result = self._sandbox.extract(pdf_path, cheap=True)
+            result.seconds += first_seconds
+            self.quarantine.mark_recovered(paper_id, result.ok)
+
+        self._record_timing(paper_id, result.seconds, "cheap" if result.cheap else "full", result.status)
+        return result.text
+
+    def _record_timing(self, paper_id: Optional[str], seconds: float, mode: str, status: str):
+        metrics.observe("parse_document_seconds", seconds, mode=mode)
+        self._timings.append({"id": paper_id, "seconds": round(seconds, 4), "mode": mode, "status": status})
+
+    def extract(self, pdf_path: str, paper_id: Optional[str] = None) -> Tuple[str, Dict[str, str]]:
+        """Raw PDF text -> (cleaned text, detected sections), references removed if configured"""
+        raw_text = self._read_pdf(pdf_path, paper_id)
+        if not raw_text:
+            return "", {}
+        if self.config['parser']['ignore_references']:
+            raw_text = self.remove_references(raw_text)
+        # Headings are only visible before cleaning joins the lines
+        sections = detect_sections(raw_text, self.clean_text)
+        return self.clean_text(raw_text), sections
+
+    def _load_packs(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.packs_path):
+            return {}
+        with open(self.packs_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _make_pack_entry(self, paper: Dict, cleaned_text: str, sections: Dict[str, str]) -> Dict:
+        return {
+            "title": paper['title'],
+            "sections": sorted(sections),
+            "packs": build_packs(sections, self.config, fallback_text=cleaned_text),
+        }
+
+    def _parse_into_store(self, paper: Dict, packs: Dict[str, Dict]) -> Optional[Dict]:
+        """
+        Parse one paper into the document store. Papers already parsed with the
+        same chunking settings (and with a context pack) are reused without
+        touching their PDF.
+        """
+        settings = {
+            "chunk_size": self.config['parser']['chunk_size'],
+            "chunk_step": self.config['parser']['chunk_size'] - self.config['parser']['chunk_overlap'],
+            "ignore_references": self.config['parser']['ignore_references'],
+        }
+        ref = self.store.get_ref(paper['id']) or {}
+
+        if not (ref.get('text') and paper['id'] in packs and all(ref.get(k) == v for k, v in settings.items())):
+            pdf_path = self.store.ensure_pdf(paper)
+            if not pdf_path:
+                logger.warning(f"⚠️ No PDF available for {paper['id']}")
+                return None
+
+            cleaned_text, sections = self.extract(pdf_path, paper['id'])
+            if not cleaned_text:
+                return None
+
+            packs[paper['id']] = self._make_pack_entry(paper, cleaned_text, sections)
+            self.store.set_ref(
+                paper['id'],
+                text=self.store.put_text(cleaned_text),
+                total_chunks=len(self.chunk_text(cleaned_text)),
+                chars=len(cleaned_text),
+                parsed_at=time.time(),
+                **settings
+            )
+            ref = self.store.get_ref(paper['id'])
+
+        if self.config['store'].get('evict_pdfs', False) and not ref.get('pdf_evicted'):
+            self.store.evict_pdf(paper['id'])
+
+        return {
+            "id": paper['id'],
+            "title": paper['title'],
+            "primary_category": paper.get('primary_category'),  # Index shard keys
+            "published": paper.get('published'),
+            "text_ref": ref['text'],  # Chunks live in the document store
+            "chunk_step": ref['chunk_step'],
+            "total_chunks": ref['total_chunks'],
+            "parsed_at": ref['parsed_at']
+        }
+
+    def _build_report(self, papers: int, parsed: int, started: float) -> Dict[str, Any]:
+        """Run summary with a histogram of per-paper extraction time (PDFs actually read this run)"""
+        seconds = sorted(t['seconds'] for t in self._timings)
+        histogram = []
+        remaining = list(seconds)
+        for bound in metrics.TIME_BUCKETS + (float("inf"),):
+            count = sum(1 for value in remaining if value <= bound)
+            remaining = remaining[count:]
+            if count:
+                histogram.append({"le": "+Inf" if bound == float("inf") else bound, "count": count})
+
+        def percentile(q: float) -> Optional[float]:
+            return seconds[min(len(seconds) - 1, int(q * len(seconds)))] if seconds else None
+
+        return {
+            "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "wall_s": round(time.perf_counter() - started, 3),
+            "papers": papers,
+            "parsed": parsed,
+            "extracted": len(self._timings),  # The rest were reused from the document store
+            "cheap_mode": sum(1 for t in self._timings if t['mode'] == "cheap" and t['status'] == "ok"),
+            "failed": [t['id'] for t in self._timings if t['status'] != "ok"],
+            "quarantined": len(self.quarantine.entries) if self.quarantine is not None else 0,
+            "parse_seconds": {
+                "total": round(sum(seconds), 3),
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": seconds[-1] if seconds else None,
+                "histogram": histogram,
+            },
+            "slowest": sorted(self._timings, key=lambda t: -t['seconds'])[:5],
+        }
+
+    def run(self) -> Optional[Dict[str, Any]]:
         papers = self._load_metadata()
         if not papers:
             logger.warning("No papers to parse.")
-            return
+            return None
 
         logger.info(f"🚀 Starting processing for {len(papers)} papers...")
         
         parsed_results = []
-        
+        packs = self._load_packs()
+        started = time.perf_counter()
+        self._timings = []
+        if self.isolation.get('enabled', False):
+            self._sandbox = ParseSandbox.from_config(self.isolation)
+        try:
+            self._parse_all(papers, packs, parsed_results)
+        finally:
+            if self._sandbox is not None:
+                self._sandbox.close()
+                self._sandbox = None
+                self.quarantine.save()
+
+        if self.store is not None:
+            self.store.save_refs()
+
+        # Save context packs (only for papers still in the corpus)
+        parsed_ids = {p['id'] for p in parsed_results}
+        with open(self.packs_path, 'w', encoding='utf-8') as f:
+            json.dump({pid: entry for pid, entry in packs.items() if pid in parsed_ids}, f, ensure_ascii=False, indent=2)
+
+        # Save results
+        with open(self.output_path, 'w', encoding='utf-8') as f:
+            json.dump(parsed_results, f, ensure_ascii=False, indent=2)
+            
+        logger.success(f"✅ Parser Agent finished. Processed {len(parsed_results)} papers.")
+        logger.info(f"💾 Results saved to: {self.output_path}")
+
+        report = self._build_report(len(papers), len(parsed_results), started)
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"⏱️  Parse report: {report['extracted']} PDFs read, p95 {report['parse_seconds']['p95']}s, "
+                    f"{len(report['failed'])} failed ({self.report_path})")
+        return report
+
+    def _parse_all(self, papers: List[Dict], packs: Dict[str, Dict], parsed_results: List[Dict]):
         # Use tqdm to show progress bar
         for paper in tqdm(papers, desc="Parsing PDFs"):
+            if self.store is not None:
+                parsed_paper = self._parse_into_store(paper, packs)
+                if parsed_paper:
+                    parsed_results.append(parsed_paper)
+                continue
+
             pdf_path = paper.get('local_pdf_path')
             
-            # 1. Extract raw text
-            raw_text = self.parse_pdf(pdf_path)
+            # 1. Extract raw text, 2. remove references, 3. clean text (+ detect sections)
+            cleaned_text, sections = self.extract(pdf_path, paper['id'])
             
-            if not raw_text:
+            if not cleaned_text:
                 continue
 
-            # 2. Whether to remove references
-            if self.config['parser']['ignore_references']:
-                raw_text = self.remove_references(raw_text)
-
-            # 3. Clean text
-            cleaned_text = self.clean_text(raw_text)
+            packs[paper['id']] = self._make_pack_entry(paper, cleaned_text, sections)
 
             # 4. Chunk
             chunks = self.chunk_text(cleaned_text)
@@ -123,19 +322,22 @@ class ParserAgent:
             parsed_paper = {
                 "id": paper['id'],
                 "title": paper['title'],
+                "primary_category": paper.get('primary_category'),
+                "published": paper.get('published'),
                 "chunks": chunks,  # Store the chunked text list here
                 "total_chunks": len(chunks),
                 "parsed_at": os.path.getmtime(pdf_path) # Simple timestamp
             }
             parsed_results.append(parsed_paper)
 
-        # Save results
-        with open(self.output_path, 'w', encoding='utf-8') as f:
-            json.dump(parsed_results, f, ensure_ascii=False, indent=2)
-            
-        logger.success(f"✅ Parser Agent finished. Processed {len(parsed_results)} papers.")
-        logger.info(f"💾 Results saved to: {self.output_path}")
-
 if __name__ == "__main__":
-    agent = ParserAgent()
-    agent.run()
+    import argparse
+    from profiling import profile_run
+
+    cli = argparse.ArgumentParser(description="Parse downloaded PDFs")
+    cli.add_argument("--profile", action="store_true", help="Save a cProfile + tracemalloc report to data/profiles/")
+    args = cli.parse_args()
+
+    with profile_run("parser", enabled=args.profile):
+        agent = ParserAgent()
+        agent.run()
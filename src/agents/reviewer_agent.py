@@ -1,8 +1,9 @@
-import ollama
 from loguru import logger
 import yaml
 from agents.vector_agent import VectorAgent
-from typing import Dict, Any
+from llm_dispatch import get_dispatcher, QueueFullError
+from context_packs import ContextPackStore
+from typing import Dict, Any, Optional
 import json
 
 class ReviewerAgent:
@@ -11,25 +12,29 @@ class ReviewerAgent:
     """
     def __init__(self, config_path: str = "config.yaml"):
         self.config = self._load_config(config_path)
+        self.packs = ContextPackStore.from_config(self.config)
         self.vector_agent = VectorAgent(config_path)
         
         self.model = self.config.get('reviewer', {}).get('model_name', 
                      self.config['summarizer']['model_name'])
+        self.llm = get_dispatcher(self.config)
 
     def _load_config(self, path: str) -> Dict:
         with open(path, 'r', encoding='utf-8') as f:
             return yaml.safe_load(f)
 
-    def review(self, paper_title: str) -> Dict[str, Any]:
+    def review(self, paper_title: str, paper_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Generates a structured report + suggested questions in JSON format.
         """
         logger.info(f"⚖️  Reviewing paper: {paper_title} using model: {self.model}")
 
-        # 1. Retrieve Context
-        search_query = f"{paper_title} methodology results limitations conclusion"
-        rag_results = self.vector_agent.search(search_query, top_k=7)
-        context_text = "\n".join([res['text'] for res in rag_results])
+        # 1. Context: precomputed key-section pack, retrieval only as a fallback
+        context_text = self.packs.get(paper_id, "review") if paper_id else self.packs.get_by_title(paper_title, "review")
+        if context_text is None:
+            search_query = f"{paper_title} methodology results limitations conclusion"
+            rag_results = self.vector_agent.search(search_query, paper_id=paper_id, top_k=7)
+            context_text = "\n".join([res['text'] for res in rag_results])
 
         # 2. JSON-Oriented Prompt
         system_prompt = f"""
@@ -55,9 +60,11 @@ class ReviewerAgent:
         
         try:
             # Force Ollama output json with format='json'
-            response = ollama.chat(
-                model=self.model, 
-                messages=messages, 
+            response = self.llm.chat(
+                self.model, 
+                messages, 
+                priority="review",
+                agent="reviewer",
                 format='json' 
             )
             
@@ -67,6 +74,8 @@ class ReviewerAgent:
             
             return parsed_result
             
+        except QueueFullError:
+            raise
         except Exception as e:
             logger.error(f"Review generation failed: {e}")
             # Fallback if JSON parsing fails
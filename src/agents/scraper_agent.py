@@ -1,21 +1,57 @@
 import os
 import json
 import time
+import threading
 import arxiv
 import requests
 import yaml
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set, Optional, Callable
+from database import upsert_papers
+
+class RateLimiter:
+    """Thread-safe minimum interval between calls, shared by all keyword workers"""
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
 
 class ScraperAgent:
-    def __init__(self, config_path: str = "config.yaml"):
+    def __init__(self, config_path: str = "config.yaml", client_factory: Optional[Callable[[], Any]] = None):
+        """
+        `client_factory` returns an object with `results(search, offset)` (default: `arxiv.Client`);
+        tests can pass a local stub instead of hitting the arXiv API.
+        """
         self.config = self._load_config(config_path)
         self.data_dir = self.config['data']['output_dir']
         self.pdf_dir = os.path.join(self.data_dir, self.config['data']['pdf_dir'])
         self.metadata_path = os.path.join(self.data_dir, self.config['data']['metadata_file'])
+        self.state_path = os.path.join(self.data_dir, self.config['scraper'].get('state_file', "scraper_state.json"))
         
         # Ensure directory exists
         os.makedirs(self.pdf_dir, exist_ok=True)
+
+        scraper_config = self.config['scraper']
+        self.page_size = scraper_config.get('page_size', 100)
+        api_interval = scraper_config.get('api_interval', 3)
+        # Our own limiter paces every page request across threads; the client's delay
+        # still spaces its internal retries of a failed page
+        self.client_factory = client_factory or (
+            lambda: arxiv.Client(page_size=self.page_size, delay_seconds=api_interval,
+                                 num_retries=scraper_config['retry_attempts'])
+        )
+        self.api_limiter = RateLimiter(api_interval)
+        self.download_limiter = RateLimiter(scraper_config['sleep_interval'])
         
         logger.info("🕵️ Scraper Agent initialized.")
 
@@ -34,8 +70,25 @@ class ScraperAgent:
         except Exception:
             return []
 
-    def _save_metadata(self, new_data: List[Dict]):
-        """Append new data to metadata.json"""
+    def _load_state(self) -> Dict[str, str]:
+        """Per-keyword high-water mark: newest `published` already harvested"""
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            logger.warning("⚠️ Scraper state corrupted, doing a full harvest.")
+            return {}
+
+    def _save_state(self, state: Dict[str, str]):
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.state_path)
+
+    def _save_metadata(self, new_data: List[Dict]) -> bool:
+        """Append new data to metadata.json (False if the write failed)"""
         existing_data = []
         if os.path.exists(self.metadata_path):
             try:
@@ -67,12 +120,14 @@ class ScraperAgent:
             # 2. Atomic rename (replace)
             os.replace(temp_path, self.metadata_path)
             logger.success(f"💾 Metadata saved atomically. Total papers: {len(unique_data)}")
+            return True
             
         except Exception as e:
             logger.error(f"❌ Failed to save metadata: {e}")
             # Cleanup temp file
             if os.path.exists(temp_path):
                 os.remove(temp_path)
+            return False
 
     def download_pdf(self, url: str, filename: str) -> bool:
         """Download PDF with retry mechanism"""
@@ -86,12 +141,13 @@ class ScraperAgent:
         retries = self.config['scraper']['retry_attempts']
         for attempt in range(retries):
             try:
+                # Polite crawling, shared across keyword workers
+                self.download_limiter.wait()
                 response = requests.get(url, stream=True, timeout=10)
                 if response.status_code == 200:
                     with open(filepath, 'wb') as f:
                         f.write(response.content)
                     logger.info(f"⬇️  Downloaded: {filename}")
-                    time.sleep(self.config['scraper']['sleep_interval'])
                     return True
             except Exception as e:
                 logger.warning(f"⚠️  Download failed ({attempt+1}/{retries}): {e}")
@@ -103,31 +159,63 @@ class ScraperAgent:
         logger.error(f"❌ Failed to download {filename} after retries.")
         return False
 
-    def run(self):
-        """Execute main process"""
-        keywords = self.config['scraper']['keywords']
-        max_results = self.config['scraper']['max_results']
-        
-        logger.info(f"🔍 Starting search for: {keywords}")
-        
-        # Build query syntax (Title OR Abstract)
-        query = " OR ".join([f'ti:"{k}" OR abs:"{k}"' for k in keywords])
-        
-        client = arxiv.Client()
-        search = arxiv.Search(
-            query=query,
-            max_results=max_results,
-            sort_by=arxiv.SortCriterion.SubmittedDate
-        )
+    def _iter_results(self, client, query: str):
+        """
+        Iterate search results newest-first, one page per request, waiting on
+        the shared limiter before each page.
+        """
+        offset = 0
+        while True:
+            search = arxiv.Search(query=query, max_results=offset + self.page_size,
+                                  sort_by=arxiv.SortCriterion.SubmittedDate)
+            self.api_limiter.wait()
+            page = list(client.results(search, offset=offset))
+            yield from page
+            if len(page) < self.page_size:
+                return
+            offset += self.page_size
 
+    def _harvest_keyword(self, keyword: str, high_water: Optional[datetime],
+                         known_ids: Set[str], known_lock: threading.Lock):
+        """
+        Walk one keyword's results newest-first until the high-water mark, taking
+        at most `max_results` new papers. Returns (new papers, new high-water mark).
+        """
+        max_results = self.config['scraper']['max_results']
         new_papers = []
-        
-        # Start scraping
-        for result in client.results(search):
+        taken = 0
+        newest = high_water
+        oldest_failed = None
+        reached_mark = False
+
+        for result in self._iter_results(self.client_factory(), f'ti:"{keyword}" OR abs:"{keyword}"'):
+            if high_water and result.published <= high_water:
+                logger.info(f"⏹️  [{keyword}] Reached known papers, stopping early.")
+                reached_mark = True
+                break
+            newest = max(newest, result.published) if newest else result.published
+
+            # Skip known papers before any metadata or PDF work
             paper_id = result.get_short_id()
+            with known_lock:
+                if paper_id in known_ids:
+                    continue
+                if taken >= max_results:
+                    break
+                known_ids.add(paper_id)
+            taken += 1
+
             filename = f"{paper_id}.pdf"
-            
-            paper_info = {
+            logger.info(f"📄 [{keyword}] Found: {result.title[:50]}...")
+
+            # Download PDF
+            if not self.download_pdf(result.pdf_url, filename):
+                with known_lock:
+                    known_ids.discard(paper_id)
+                oldest_failed = min(oldest_failed, result.published) if oldest_failed else result.published
+                continue
+
+            new_papers.append({
                 "id": paper_id,
                 "title": result.title,
                 "authors": [author.name for author in result.authors],
@@ -137,22 +225,76 @@ class ScraperAgent:
                 "pdf_url": result.pdf_url,
                 "local_pdf_path": os.path.join(self.pdf_dir, filename),
                 "crawled_at": time.strftime("%Y-%m-%d %H:%M:%S")
+            })
+        else:
+            reached_mark = True  # No older results left
+
+        # Stopped by max_results before reaching the old mark: keep it, so the next
+        # run walks on past the papers taken here and fills the rest of the gap
+        if high_water and not reached_mark:
+            logger.info(f"⏸️  [{keyword}] Took {max_results} new papers before reaching known ones; resuming next run.")
+            return new_papers, high_water
+
+        # Keep failed downloads above the mark so the next run retries them
+        if oldest_failed and newest and newest >= oldest_failed:
+            newest = oldest_failed - timedelta(microseconds=1)
+            if high_water and newest < high_water:
+                newest = high_water
+
+        return new_papers, newest
+
+    def run(self):
+        """Execute main process"""
+        keywords = self.config['scraper']['keywords']
+        state = self._load_state()
+        known_ids = set(self._get_existing_ids())
+        known_lock = threading.Lock()
+        
+        logger.info(f"🔍 Starting incremental search for: {keywords} ({len(known_ids)} known papers)")
+
+        max_workers = self.config['scraper'].get('max_workers', len(keywords)) or 1
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                keyword: pool.submit(
+                    self._harvest_keyword, keyword,
+                    datetime.fromisoformat(state[keyword]) if keyword in state else None,
+                    known_ids, known_lock
+                )
+                for keyword in keywords
             }
 
-            logger.info(f"📄 Found: {result.title[:50]}...")
-            
-            # Download PDF
-            if self.download_pdf(result.pdf_url, filename):
-                new_papers.append(paper_info)
+        new_papers = []
+        for keyword, future in futures.items():
+            try:
+                papers, high_water = future.result()
+            except Exception as e:
+                logger.error(f"❌ Harvest failed for '{keyword}': {e}")
+                continue
+            new_papers.extend(papers)
+            if high_water:
+                state[keyword] = high_water.isoformat()
         
         # Save Metadata
         if new_papers:
-            self._save_metadata(new_papers)
+            # The marks only move once the papers are on record, so a failed write is retried next run
+            if not self._save_metadata(new_papers):
+                logger.error("❌ Keeping the previous high-water marks.")
+                return
+            upsert_papers(new_papers)  # Keep the metadata search index current
             logger.success(f"✅ Scraper Agent finished. Processed {len(new_papers)} papers.")
         else:
             logger.info("🤷 No new papers downloaded.")
+        self._save_state(state)
 
 if __name__ == "__main__":
+    import argparse
+    from profiling import profile_run
+
+    cli = argparse.ArgumentParser(description="Harvest new papers from arXiv")
+    cli.add_argument("--profile", action="store_true", help="Save a cProfile + tracemalloc report to data/profiles/")
+    args = cli.parse_args()
+
     # For standalone testing
-    agent = ScraperAgent()
-    agent.run()
+    with profile_run("scraper", enabled=args.profile):
+        agent = ScraperAgent()
+        agent.run()
@@ -1,12 +1,13 @@
 import os
 import json
 import yaml
-import ollama
 from loguru import logger
 from typing import Dict, Any, List
 
 # Import VectorAgent for RAG retrieval
 from agents.vector_agent import VectorAgent
+from llm_dispatch import get_dispatcher, QueueFullError
+from context_packs import ContextPackStore
 
 class SummarizerAgent:
     def __init__(self, config_path: str = "config.yaml"):
@@ -14,10 +15,12 @@ class SummarizerAgent:
         self.data_dir = self.config['data']['output_dir']
         self.metadata_path = os.path.join(self.data_dir, self.config['data']['metadata_file'])
         
-        # Initialize Vector Agent for retrieval
+        # Precomputed key-section contexts; Vector Agent retrieval is the fallback
+        self.packs = ContextPackStore.from_config(self.config)
         self.vector_agent = VectorAgent(config_path)
         
         self.model = self.config['summarizer']['model_name']
+        self.llm = get_dispatcher(self.config)
         logger.info(f"📝 Summarizer Agent initialized using model: {self.model}")
 
     def _load_config(self, path: str) -> Dict[str, Any]:
@@ -44,14 +47,14 @@ class SummarizerAgent:
         title = target_paper['title']
         abstract = target_paper['summary']
         
-        # 2. RAG retrieval: find excerpts about "methodology" and "conclusion" in this paper
-        # Note: here we simply search with title + keywords, real application may need to filter by paper_id (advanced FAISS usage)
-        # To simplify the prototype, we assume most searched content is relevant, or only use Abstract + first few chunks
-        
-        # Strategy: combine Abstract + supplementary information from search
-        context_query = f"{title} methodology and conclusion"
-        rag_results = self.vector_agent.search(context_query, top_k=3)
-        rag_text = "\n".join([res['text'] for res in rag_results])
+        # 2. Key sections: precomputed context pack for this paper and mode (one lookup)
+        rag_text = self.packs.get(paper_id, mode)
+
+        if rag_text is None:
+            # Fallback for papers without a pack: RAG retrieval of "methodology" and "conclusion" excerpts
+            context_query = f"{title} methodology and conclusion"
+            rag_results = self.vector_agent.search(context_query, paper_id=paper_id, top_k=3)
+            rag_text = "\n".join([res['text'] for res in rag_results])
         
         # 3. Build Prompt
         # Combine content: title + abstract + RAG retrieved content
@@ -67,24 +70,36 @@ class SummarizerAgent:
 
         # 4. Call Ollama
         try:
-            response = ollama.chat(model=self.model, messages=[
+            # Quick summaries are interactive; detailed reports are background-style work
+            priority = "summary" if mode == "quick_summary" else "batch"
+            response = self.llm.chat(self.model, [
                 {'role': 'system', 'content': system_prompt},
                 {'role': 'user', 'content': user_message},
-            ])
+            ], priority=priority, agent="summarizer")
             
             return response['message']['content']
             
+        except QueueFullError:
+            raise
         except Exception as e:
             logger.error(f"❌ Ollama generation failed: {e}")
             return f"Generation Error: {e}"
 
 if __name__ == "__main__":
-    # For testing: run the first paper directly
-    agent = SummarizerAgent()
-    papers = agent._load_metadata()
-    if papers:
-        first_paper_id = papers[0]['id']
-        print(f"Summarizing Paper: {first_paper_id}...")
-        summary = agent.generate_summary(first_paper_id, mode="quick_summary")
-        print("\n=== Summary Result ===\n")
-        print(summary)
+    import argparse
+    from profiling import profile_run
+
+    cli = argparse.ArgumentParser(description="Summarize the first paper")
+    cli.add_argument("--profile", action="store_true", help="Save a cProfile + tracemalloc report to data/profiles/")
+    args = cli.parse_args()
+
+    with profile_run("summarizer", enabled=args.profile):
+        # For testing: run the first paper directly
+        agent = SummarizerAgent()
+        papers = agent._load_metadata()
+        if papers:
+            first_paper_id = papers[0]['id']
+            print(f"Summarizing Paper: {first_paper_id}...")
+            summary = agent.generate_summary(first_paper_id, mode="quick_summary")
+            print("\n=== Summary Result ===\n")
+            print(summary)
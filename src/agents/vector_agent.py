@@ -1,15 +1,60 @@
 import os
+import re
 import json
+import shutil
+import hashlib
+import time
+import threading
 import yaml
-import faiss
 import numpy as np
 from loguru import logger
 from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from embedding_engine import EmbeddingEngine
+from retrieval_service import RetrievalClient
+from doc_store import DocumentStore, load_chunks
+from chunk_dedup import ChunkDeduplicator
+from snapshot import SnapshotManager
+from paper_graph import PaperGraph, CentroidAccumulator
+import metrics
+
+# torch / sentence-transformers / faiss are imported lazily: they dominate
+# import time and are not needed until the first embedding or search.
+_MODEL_CACHE: Dict[str, Any] = {}
+SHARDS_FILE = "shards.json"  # Shard manifest of a sharded index directory
+_MODEL_LOCK = threading.Lock()
+
+def load_embedding_model(model_name: str):
+    """Load a SentenceTransformer once per process and share it between agents."""
+    with _MODEL_LOCK:
+        metrics.inc("cache_requests_total", cache="embedding_model",
+                    result="hit" if model_name in _MODEL_CACHE else "miss")
+        if model_name not in _MODEL_CACHE:
+            from sentence_transformers import SentenceTransformer
+
+            # First run will auto-download, about 80MB
+            logger.info(f"🧠 Loading embedding model: {model_name}...")
+            start = time.perf_counter()
+            _MODEL_CACHE[model_name] = SentenceTransformer(model_name)
+            logger.info(f"✅ Model loaded in {time.perf_counter() - start:.2f}s.")
+        return _MODEL_CACHE[model_name]
+
+def _link_tree(source_dir: str, target_dir: str):
+    """Hard-link an unchanged shard into a new generation (copy if linking is not possible)."""
+    os.makedirs(target_dir, exist_ok=True)
+    for name in os.listdir(source_dir):
+        try:
+            os.link(os.path.join(source_dir, name), os.path.join(target_dir, name))
+        except OSError:
+            shutil.copy2(os.path.join(source_dir, name), os.path.join(target_dir, name))
+
+def _chunk_papers(meta: Dict) -> List[str]:
+    """Every paper a stored chunk stands for (collapsed duplicates count for each of their papers)."""
+    return [meta['paper_id']] + [alias['paper_id'] for alias in meta.get('aliases', [])]
 
 class VectorAgent:
-    def __init__(self, config_path: str = "config.yaml"):
+    def __init__(self, config_path: str = "config.yaml", use_retrieval_service: bool = True):
         self.config = self._load_config(config_path)
         self.data_dir = self.config['data']['output_dir']
         
@@ -19,12 +64,42 @@ class VectorAgent:
         # Output: FAISS index and ID mapping
         self.index_path = os.path.join(self.data_dir, self.config['vector']['index_file'])
         self.map_path = os.path.join(self.data_dir, self.config['vector']['chunks_map_file'])
-        
-        # Load model (first run will auto-download, about 80MB)
-        model_name = self.config['vector']['model_name']
-        logger.info(f"🧠 Loading embedding model: {model_name}...")
-        self.model = SentenceTransformer(model_name)
-        logger.info("✅ Model loaded.")
+
+        # Model is loaded on first use (see `model`)
+        self._model = None
+
+        # Index builds go into snapshot generations; searches follow the CURRENT pointer
+        self.snapshots = SnapshotManager.from_config(self.config) \
+            if self.config.get('snapshots', {}).get('enabled', False) else None
+        self._loaded = None  # (generation key, faiss index, metadata map)
+        self._load_lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None  # Shard fan-out, created on first multi-shard search
+
+        # Chunk text lives in the document store when it is enabled
+        self.store = DocumentStore.from_config(self.config) if self.config.get('store', {}).get('enabled', False) else None
+
+        # Optional shared retrieval service: encode/search go over its socket instead
+        service_config = self.config['vector'].get('retrieval_service', {})
+        self.client = None
+        if use_retrieval_service and service_config.get('enabled', False):
+            self.client = RetrievalClient(
+                service_config.get('socket_path', "./data/retrieval.sock"),
+                timeout=service_config.get('timeout', 30),
+            )
+            logger.info(f"🛰️  Using retrieval service at {self.client.socket_path}")
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = load_embedding_model(self.config['vector']['model_name'])
+        return self._model
+
+    def warm_up(self):
+        """Load the model, or check the retrieval service is reachable"""
+        if self.client is not None:
+            self.client.ping()
+        else:
+            self.model
 
     def _load_config(self, path: str) -> Dict[str, Any]:
         with open(path, 'r', encoding='utf-8') as f:
@@ -37,96 +112,487 @@ class VectorAgent:
         with open(self.input_path, 'r', encoding='utf-8') as f:
             return json.load(f)
 
+    def _paper_partitions(self, papers: List[Dict]) -> Dict[str, tuple]:
+        """paper id -> (primary category, publication month), from the parsed entry or metadata.json"""
+        metadata = {}
+        metadata_path = os.path.join(self.data_dir, self.config['data']['metadata_file'])
+        if any('primary_category' not in p or 'published' not in p for p in papers) and os.path.exists(metadata_path):
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = {item['id']: item for item in json.load(f)}
+
+        partitions = {}
+        for paper in papers:
+            source = paper if 'published' in paper else metadata.get(paper['id'], {})
+            category = source.get('primary_category') or "unknown"
+            month = (source.get('published') or "")[:7] or "unknown"
+            partitions[paper['id']] = (category, month)
+        return partitions
+
+    def _shard_key(self, category: str, month: str) -> tuple:
+        """(shard key, shard category, shard month) for the configured sharding scheme"""
+        sharding = self.config['vector'].get('sharding', {})
+        if not sharding.get('enabled', False):
+            return "all", None, None
+        by = sharding.get('by', "category_month")
+        category = category if by in ("category", "category_month") else None
+        month = month if by in ("month", "category_month") else None
+        key = "__".join(part for part in (category, month) if part is not None)
+        return re.sub(r"[^\w.-]", "_", key), category, month
+
     def create_index(self):
         papers = self._load_parsed_data()
         if not papers:
             return
 
-        all_chunks = []
-        metadata_map = {} # For reverse lookup during retrieval: ID -> (Paper Title, Text)
-        
-        # 1. Organize all paper chunks
-        global_id = 0
+        # 1. Organize all paper chunks, grouped by shard
         logger.info("📦 Preparing chunks for embedding...")
-        
+        partitions = self._paper_partitions(papers)
+        groups: Dict[str, Dict[str, Any]] = {}
+
         for paper in papers:
             paper_title = paper['title']
-            for chunk in paper['chunks']:
-                all_chunks.append(chunk)
-                metadata_map[str(global_id)] = {
-                    "paper_id": paper['id'],
-                    "title": paper_title,
-                    "text": chunk
-                }
-                global_id += 1
-
-        if not all_chunks:
+            category, month = partitions[paper['id']]
+            shard, shard_category, shard_month = self._shard_key(category, month)
+            group = groups.setdefault(shard, {"category": shard_category, "month": shard_month,
+                                              "chunks": [], "metas": [], "papers": set()})
+            group['papers'].add(paper['id'])
+            for i, chunk in enumerate(load_chunks(paper, self.store)):
+                group['chunks'].append(chunk)
+                meta = {"paper_id": paper['id'], "title": paper_title, "category": category, "month": month}
+                if 'text_ref' in paper:
+                    # Reference the stored text instead of duplicating it in the map
+                    start = i * paper['chunk_step']
+                    meta.update(text_ref=paper['text_ref'], start=start, end=start + len(chunk))
+                else:
+                    meta["text"] = chunk
+                group['metas'].append(meta)
+
+        if not any(group['chunks'] for group in groups.values()):
             logger.warning("No chunks found to embed.")
             return
 
-        # 2. Generate vectors (Embedding)
-        logger.info(f"🚀 Embedding {len(all_chunks)} chunks... (This may take a while)")
-        batch_size = self.config['vector']['batch_size']
-        
-        # encode returns numpy array
-        embeddings = self.model.encode(all_chunks, batch_size=batch_size, show_progress_bar=True)
-        
-        # 3. Create FAISS index
-        # Vector dimension (all-MiniLM-L6-v2 is 384 dimensions)
-        dimension = embeddings.shape[1] 
-        index = faiss.IndexFlatL2(dimension) # Use L2 distance (Euclidean distance)
-        
-        # Add vectors
-        index.add(embeddings)
+        # Drop boilerplate and collapse near-duplicates across the whole corpus: both usually span
+        # many shards, and per-shard groups are often too small to reach boilerplate_min_papers
+        dedup_config = self.config['vector'].get('dedup', {})
+        if dedup_config.get('enabled', False):
+            self._deduplicate(groups, dedup_config)
+
+        # Paper centroids are collected while embedding, for the related-papers graph
+        related = self.config['vector'].get('related', {}).get('enabled', False)
+        accumulator = CentroidAccumulator() if related else None
+        titles = {paper['id']: paper['title'] for paper in papers}
+
+        # 2.-4. Embed and save, into a new snapshot generation when snapshots are enabled
+        if self.snapshots is None:
+            previous_root = self._active_root()[1]
+            self._build_shards(groups, self.data_dir, accumulator)
+            if related:
+                self._update_related(accumulator, titles, previous_root, self.data_dir)
+            return
+
+        # Build a new generation next to the live one, then swap the pointer
+        generation, staging = self.snapshots.begin()
+        try:
+            previous_root = self._active_root()[1]
+            vectors = self._build_shards(groups, staging, accumulator)
+            if related:
+                self._update_related(accumulator, titles, previous_root, staging)
+            packs_file = self.config['parser'].get('context_packs', {}).get('output_file', "context_packs.json")
+            for name in (self.config['data']['metadata_file'], packs_file):
+                source = os.path.join(self.data_dir, name)
+                if os.path.exists(source):
+                    shutil.copyfile(source, os.path.join(staging, name))
+            self.snapshots.commit(generation, staging,
+                                  {"vectors": vectors, "papers": len(papers), "shards": len(groups)})
+        except Exception:
+            self.snapshots.abort(staging)
+            raise
+
+    def _fingerprint(self, metas: List[Dict]) -> str:
+        """Everything that determines a shard's vectors; equal fingerprints mean the shard can be reused."""
+        vector_config = self.config['vector']
+        payload = json.dumps({
+            "model": vector_config['model_name'],
+            "backend": vector_config.get('engine', {}).get('backend', "torch"),
+            "dedup": vector_config.get('dedup', {}),
+            "metas": metas,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _build_shards(self, groups: Dict[str, Dict[str, Any]], target: str,
+                      accumulator: Optional[CentroidAccumulator] = None) -> int:
+        """Embed and write every shard under `target`; unchanged shards are linked from the live index."""
+        vector_config = self.config['vector']
+        index_file, map_file = vector_config['index_file'], vector_config['chunks_map_file']
+
+        if not vector_config.get('sharding', {}).get('enabled', False):
+            group = groups["all"]
+            with EmbeddingEngine.from_config(vector_config, self.model) as engine:
+                index, metadata_map = self._embed_group(engine, group, accumulator=accumulator)
+            if index is None:
+                logger.warning("No chunks left to embed after deduplication.")
+                return 0
+            self._write_index(index, metadata_map, os.path.join(target, index_file), os.path.join(target, map_file))
+            if os.path.exists(os.path.join(target, SHARDS_FILE)):
+                os.remove(os.path.join(target, SHARDS_FILE))  # Switched back from a sharded layout
+            return int(index.ntotal)
+
+        previous = self._read_layout(self._active_root()[1]) or {"shards": {}}
+        layout = {"shards": {}, "papers": {}}
+        to_build = []
+        for shard, group in sorted(groups.items()):
+            fingerprint = self._fingerprint(group['metas'])
+            entry = {"category": group['category'], "month": group['month'], "fingerprint": fingerprint}
+            old = previous['shards'].get(shard)
+            shard_dir = os.path.join(target, "shards", shard)
+            if old is not None and old.get('fingerprint') == fingerprint and \
+                    os.path.exists(os.path.join(old['dir'], index_file)):
+                if os.path.abspath(old['dir']) != os.path.abspath(shard_dir):
+                    _link_tree(old['dir'], shard_dir)
+                entry['vectors'] = old['vectors']
+            else:
+                to_build.append((shard, group, entry))
+            layout['shards'][shard] = entry
+            layout['papers'].update({pid: shard for pid in group['papers']})
+
+        # Chunks collapsed into a representative from another shard: paper searches visit that shard too
+        alias_shards: Dict[str, set] = {}
+        for shard, group in groups.items():
+            for meta in group['metas']:
+                for alias in meta.get('aliases', []):
+                    if layout['papers'].get(alias['paper_id']) != shard:
+                        alias_shards.setdefault(alias['paper_id'], set()).add(shard)
+        layout['alias_shards'] = {pid: sorted(shards) for pid, shards in alias_shards.items()}
+
+        logger.info(f"🧩 {len(to_build)}/{len(groups)} shards changed; reusing the rest.")
+        if to_build:
+            with EmbeddingEngine.from_config(vector_config, self.model) as engine:
+                for shard, group, entry in to_build:
+                    index, metadata_map = self._embed_group(engine, group, desc=f"Embedding {shard}",
+                                                                accumulator=accumulator)
+                    if index is None:
+                        del layout['shards'][shard]
+                        continue
+                    shard_dir = os.path.join(target, "shards", shard)
+                    if os.path.isdir(shard_dir):
+                        shutil.rmtree(shard_dir)
+                    os.makedirs(shard_dir)
+                    self._write_index(index, metadata_map,
+                                      os.path.join(shard_dir, index_file), os.path.join(shard_dir, map_file))
+                    entry['vectors'] = int(index.ntotal)
+
+        # Shards that no longer have papers (in-place layout only; generations start empty)
+        shards_dir = os.path.join(target, "shards")
+        for name in os.listdir(shards_dir) if os.path.isdir(shards_dir) else []:
+            if name not in layout['shards']:
+                shutil.rmtree(os.path.join(shards_dir, name), ignore_errors=True)
+
+        # The shard manifest is written last: it is what makes the new shards visible
+        temp_path = os.path.join(target, f"{SHARDS_FILE}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(layout, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, os.path.join(target, SHARDS_FILE))
+        return sum(entry['vectors'] for entry in layout['shards'].values())
+
+    def _embed_group(self, engine: EmbeddingEngine, group: Dict[str, Any], desc: str = "Embedding chunks",
+                     accumulator: Optional[CentroidAccumulator] = None) -> tuple:
+        """(FAISS index, id -> chunk metadata) for one shard; index is None if nothing is left to embed"""
+        import faiss
+
+        chunks, metas = group['chunks'], group['metas']
+        if not chunks:
+            return None, {}
+
+        # For reverse lookup during retrieval: ID -> (Paper Title, Text)
+        metadata_map = {str(local_id): meta for local_id, meta in enumerate(metas)}
+
+        # Generate vectors (Embedding) and fill the FAISS index batch by batch
+        logger.info(f"🚀 Embedding {len(chunks)} chunks... (This may take a while)")
+        index = None
+        progress = tqdm(total=len(chunks), desc=desc)
+        for embeddings in engine.encode_stream(chunks):
+            if index is None:
+                # Vector dimension (all-MiniLM-L6-v2 is 384 dimensions)
+                index = faiss.IndexFlatL2(embeddings.shape[1]) # Use L2 distance (Euclidean distance)
+            if accumulator is not None:
+                # Batches arrive in input order, so ntotal is the first chunk's offset
+                batch = metas[index.ntotal:index.ntotal + len(embeddings)]
+                accumulator.add([_chunk_papers(meta) for meta in batch], embeddings)
+            index.add(embeddings)
+            progress.update(len(embeddings))
+        progress.close()
+
         logger.info(f"✅ Created FAISS index with {index.ntotal} vectors.")
+        return index, metadata_map
+
+    def _update_related(self, accumulator: CentroidAccumulator, titles: Dict[str, str],
+                        previous_root: str, target: str):
+        """Fold this run's paper centroids into the previous related-papers graph and save it under `target`."""
+        related_config = self.config['vector'].get('related', {})
+        graph = PaperGraph.load(previous_root, k=related_config.get('k', 10),
+                                resolution=related_config.get('resolution', 1.0))
 
-        # 4. Save files
-        faiss.write_index(index, self.index_path)
-        with open(self.map_path, 'w', encoding='utf-8') as f:
+        # Papers in reused shards keep their stored centroid; ones the old graph lacks
+        # (e.g. the graph was just enabled) are rebuilt from their shard's stored vectors
+        known = set(graph.ids) | set(accumulator.sums)
+        if any(pid not in known for pid in titles):
+            layout = self._read_layout(target) or {"shards": {}}
+            for entry in layout['shards'].values():
+                self._accumulate_from_index(accumulator, entry['dir'], skip=known)
+
+        with metrics.span("paper_graph_update"):
+            stats = graph.update(accumulator.centroids(), titles)
+        graph.save(target)
+        logger.success(f"🕸️  Related-papers graph: {stats['papers']} papers, {len(graph.clusters)} clusters "
+                       f"({stats['recomputed']} neighbour lists recomputed, {stats['changed']} papers changed).")
+
+    def _accumulate_from_index(self, accumulator: CentroidAccumulator, shard_dir: str, skip: set):
+        import faiss
+
+        vector_config = self.config['vector']
+        with open(os.path.join(shard_dir, vector_config['chunks_map_file']), 'r', encoding='utf-8') as f:
+            metadata_map = json.load(f)
+        rows = [int(i) for i, meta in metadata_map.items()
+                if any(pid not in skip for pid in _chunk_papers(meta))]
+        if not rows:
+            return
+        index = faiss.read_index(os.path.join(shard_dir, vector_config['index_file']))
+        vectors = np.stack([index.reconstruct(i) for i in rows])
+        accumulator.add([[pid for pid in _chunk_papers(metadata_map[str(i)]) if pid not in skip] for i in rows],
+                        vectors)
+
+    @staticmethod
+    def _write_index(index, metadata_map: Dict, index_path: str, map_path: str):
+        import faiss
+
+        faiss.write_index(index, index_path)
+        with open(map_path, 'w', encoding='utf-8') as f:
             json.dump(metadata_map, f, ensure_ascii=False, indent=2)
-            
-        logger.success(f"💾 Index saved to {self.index_path}")
-        logger.success(f"💾 Map saved to {self.map_path}")
 
-    def search(self, query: str, paper_id: Optional[str] = None, top_k: int = 3) -> List[Dict]:
-        """(For testing) Semantic search function"""
-        if not os.path.exists(self.index_path):
+        logger.success(f"💾 Index saved to {index_path}")
+        logger.success(f"💾 Map saved to {map_path}")
+
+    def _active_root(self) -> tuple:
+        """(cache key, directory) of the index searches should use."""
+        generation = self.snapshots.current() if self.snapshots is not None else None
+        if generation is not None:
+            return generation, self.snapshots.path(generation)
+        # Legacy in-place files: reload when they change on disk
+        try:
+            shards_path = os.path.join(self.data_dir, SHARDS_FILE)
+            key = os.path.getmtime(shards_path) if os.path.exists(shards_path) else \
+                (os.path.getmtime(self.index_path), os.path.getmtime(self.map_path))
+        except OSError:
+            key = None
+        return key, self.data_dir
+
+    def _read_layout(self, root: str) -> Optional[Dict[str, Any]]:
+        """Shard manifest of an index directory; a monolithic index is a single unfiltered shard."""
+        shards_path = os.path.join(root, SHARDS_FILE)
+        if os.path.exists(shards_path):
+            with open(shards_path, 'r', encoding='utf-8') as f:
+                layout = json.load(f)
+            for shard, entry in layout['shards'].items():
+                entry['dir'] = os.path.join(root, "shards", shard)
+            return layout
+        if os.path.exists(os.path.join(root, self.config['vector']['index_file'])):
+            return {"shards": {"all": {"category": None, "month": None, "dir": root}}, "papers": {}}
+        return None
+
+    def _load_index(self) -> Optional[Dict[str, Any]]:
+        """The loaded shard layout (index + map per shard), reloaded only when the generation changes."""
+        key, root = self._active_root()
+        loaded = self._loaded
+        if key is not None and loaded is not None and loaded[0] == key:
+            metrics.inc("cache_requests_total", cache="vector_index", result="hit")
+            return loaded[1]
+        layout = self._read_layout(root) if key is not None else None
+        if layout is None:
+            return None
+
+        import faiss
+
+        with self._load_lock:
+            if self._loaded is None or self._loaded[0] != key:
+                metrics.inc("cache_requests_total", cache="vector_index", result="miss")
+                vector_config = self.config['vector']
+                for entry in layout['shards'].values():
+                    with metrics.span("index_load"):
+                        entry['index'] = faiss.read_index(os.path.join(entry['dir'], vector_config['index_file']))
+                    with metrics.span("chunk_map_load"):
+                        with open(os.path.join(entry['dir'], vector_config['chunks_map_file']), 'r', encoding='utf-8') as f:
+                            entry['map'] = json.load(f)
+                self._loaded = (key, layout)
+                logger.info(f"📂 Loaded index {key if isinstance(key, str) else root} "
+                            f"({sum(e['index'].ntotal for e in layout['shards'].values())} vectors, "
+                            f"{len(layout['shards'])} shards)")
+            return self._loaded[1]
+
+    def _deduplicate(self, groups: Dict[str, Dict[str, Any]], dedup_config: Dict):
+        """
+        Keep one representative per near-duplicate cluster of the whole corpus, in the
+        shard of its own paper; other occurrences become its aliases. Updates `groups`.
+        """
+        located = [(shard, chunk, meta) for shard, group in groups.items()
+                   for chunk, meta in zip(group['chunks'], group['metas'])]
+        result = ChunkDeduplicator.from_config(dedup_config).dedup(
+            [(meta['paper_id'], chunk) for _, chunk, meta in located]
+        )
+
+        for group in groups.values():
+            group['chunks'], group['metas'] = [], []
+        for i in result.kept:
+            shard, chunk, meta = located[i]
+            if i in result.aliases:
+                meta = {**meta, "aliases": [
+                    {"paper_id": located[j][2]['paper_id'], "title": located[j][2]['title']}
+                    for j in result.aliases[i]
+                ]}
+            groups[shard]['chunks'].append(chunk)
+            groups[shard]['metas'].append(meta)
+
+        stats = result.stats()
+        metrics.inc("dedup_removed_chunks_total", result.near_duplicates, reason="near_duplicate")
+        metrics.inc("dedup_removed_chunks_total", result.boilerplate, reason="boilerplate")
+        logger.info(
+            f"🧹 Dedup: {stats['removed_chunks']}/{stats['total_chunks']} vectors removed "
+            f"({stats['near_duplicates']} near-duplicates, {stats['boilerplate']} boilerplate)."
+        )
+
+    def _chunk_text(self, meta: Dict) -> Optional[str]:
+        if 'text_ref' not in meta:
+            return meta.get('text')
+        if self.store is None:
+            self.store = DocumentStore.from_config(self.config)
+        return self.store.get_range(meta['text_ref'], meta['start'], meta['end'])
+
+    def encode(self, texts: List[str], normalize: bool = False) -> np.ndarray:
+        """Embed short texts (queries) with the shared model"""
+        with metrics.span("embedding", stage="query"):
+            if self.client is not None:
+                return self.client.encode(texts, normalize=normalize)
+            return self.model.encode(texts, normalize_embeddings=normalize)
+
+    def search(self, query: str, paper_id: Optional[str] = None, top_k: int = 3,
+               categories: Optional[List[str]] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None) -> List[Dict]:
+        """
+        Semantic search. `categories` (arXiv primary categories) and
+        `date_from`/`date_to` ("YYYY-MM" or ISO dates, month granularity)
+        restrict results and skip shards they exclude.
+        """
+        if self.client is not None:
+            return self.client.search(query, paper_id=paper_id, top_k=top_k,
+                                      categories=categories, date_from=date_from, date_to=date_to)
+
+        if self._load_index() is None:
             logger.error("❌ Index not found.")
             return []
 
-        # 載入索引
-        index = faiss.read_index(self.index_path)
-        with open(self.map_path, 'r', encoding='utf-8') as f:
-            metadata_map = json.load(f)
-
         # Query vectorization
-        query_vector = self.model.encode([query])
-        
-        search_k = top_k * 10 if paper_id else top_k
+        query_vector = self.encode([query])
+        return self.search_by_vector(query_vector, paper_id=paper_id, top_k=top_k,
+                                     categories=categories, date_from=date_from, date_to=date_to)
+
+    def _search_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._load_lock:
+                if self._pool is None:
+                    workers = self.config['vector'].get('sharding', {}).get('max_workers', 4)
+                    self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard-search")
+        return self._pool
+
+    @staticmethod
+    def _shard_matches(entry: Dict, categories: Optional[set], month_from: Optional[str],
+                       month_to: Optional[str]) -> bool:
+        category, month = entry.get('category'), entry.get('month')
+        if categories and category is not None and category not in categories:
+            return False
+        if month is not None and month != "unknown":
+            if (month_from and month < month_from) or (month_to and month > month_to):
+                return False
+        return True
+
+    def search_by_vector(self, query_vector: np.ndarray, paper_id: Optional[str] = None, top_k: int = 3,
+                         categories: Optional[List[str]] = None, date_from: Optional[str] = None,
+                         date_to: Optional[str] = None) -> List[Dict]:
+        """Search the index with an already-embedded query, fanning out over the matching shards"""
+        # 載入索引 (cached per snapshot generation)
+        layout = self._load_index()
+        if layout is None:
+            logger.error("❌ Index not found.")
+            return []
+
+        categories = set(categories) if categories else None
+        month_from = date_from[:7] if date_from else None
+        month_to = date_to[:7] if date_to else None
+
+        # A paper lives in one shard (plus any holding its collapsed duplicates); filters prune whole shards
+        if paper_id and paper_id in layout['papers']:
+            names = [layout['papers'][paper_id]] + layout.get('alias_shards', {}).get(paper_id, [])
+            shards = [layout['shards'][name] for name in names if name in layout['shards']]
+        else:
+            shards = [entry for entry in layout['shards'].values()
+                      if self._shard_matches(entry, categories, month_from, month_to)]
+        metrics.inc("vector_shards_searched_total", len(shards))
+        if not shards:
+            return []
+
+        filtered = bool(paper_id or categories or month_from or month_to)
+        search_k = top_k * 10 if filtered else top_k
+
+        # Search (FAISS releases the GIL, so shards are searched in parallel)
+        def search_shard(entry: Dict) -> tuple:
+            return entry, entry['index'].search(query_vector, min(search_k, entry['index'].ntotal))
+
+        with metrics.span("faiss_search"):
+            if len(shards) == 1:
+                shard_hits = [search_shard(shards[0])]
+            else:
+                shard_hits = list(self._search_pool().map(search_shard, shards))
+
+        # Merge top-k across shards (smaller distance means more similar)
+        candidates = sorted(
+            (float(distances[0][i]), n, int(idx))
+            for n, (entry, (distances, indices)) in enumerate(shard_hits)
+            for i, idx in enumerate(indices[0]) if idx != -1
+        )
 
-        # Search
-        distances, indices = index.search(query_vector, search_k)
-        
         results = []
-        for i, idx in enumerate(indices[0]):
-            if idx == -1: continue # No results
-            meta = metadata_map.get(str(idx), {})
-
-            if paper_id and meta['paper_id'] != paper_id:
-                continue
-
-            results.append({
-                "score": float(distances[0][i]), # Smaller distance means more similar
-                "paper_title": meta.get('title'),
-                "text": meta.get('text')
-            })
-
-            if len(results) >= top_k:
-                break
-            
+        with metrics.span("chunk_map_lookup"):
+            for distance, n, idx in candidates:
+                meta = shard_hits[n][0]['map'].get(str(idx), {})
+                if not self._shard_matches(meta, categories, month_from, month_to):
+                    continue
+
+                title = meta.get('title')
+                if paper_id and meta['paper_id'] != paper_id:
+                    # Collapsed duplicates still belong to every paper that contains them
+                    alias = next((a for a in meta.get('aliases', []) if a['paper_id'] == paper_id), None)
+                    if alias is None:
+                        continue
+                    title = alias['title']
+
+                results.append({
+                    "score": distance, # Smaller distance means more similar
+                    "paper_title": title,
+                    "text": self._chunk_text(meta)
+                })
+
+                if len(results) >= top_k:
+                    break
+
         return results
 
 if __name__ == "__main__":
+    import argparse
+    from profiling import profile_run
+
+    cli = argparse.ArgumentParser(description="Build the vector index")
+    cli.add_argument("--profile", action="store_true", help="Save a cProfile + tracemalloc report to data/profiles/")
+    args = cli.parse_args()
+
     # When run standalone, create index
-    agent = VectorAgent()
-    agent.create_index()
+    with profile_run("vector", enabled=args.profile):
+        agent = VectorAgent()
+        agent.create_index()
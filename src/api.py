@@ -1,13 +1,20 @@
+import time
+_BOOT_STARTED = time.perf_counter()
+
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Query, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
+from loguru import logger
 import os
 import json
 import yaml
+import importlib
+import threading
 
-# Import original Agents
+# Import original Agents (heavy dependencies inside them are imported lazily)
 from agents.scraper_agent import ScraperAgent
 from agents.parser_agent import ParserAgent
 from agents.vector_agent import VectorAgent
@@ -15,18 +22,90 @@ from agents.summarizer_agent import SummarizerAgent
 from agents.chat_agent import ChatAgent
 from agents.reviewer_agent import ReviewerAgent
 
-from database import init_db, toggle_bookmark, get_all_bookmarks, add_chat_message, get_chat_history
+import metrics
+from llm_dispatch import QueueFullError
+from profiling import ProfileStore, ProfilingMiddleware, is_admin
+from paper_graph import PaperGraphStore
+from database import (init_db, toggle_bookmark, get_all_bookmarks, add_chat_message, get_chat_history,
+                      get_chat_memory, search_papers, sync_papers_from_metadata)
+
+_API_IMPORTED = time.perf_counter()
 
-# Load Agents (global variables)
 def load_config():
     with open("config.yaml", "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
 config = load_config()
-summarizer_agent = SummarizerAgent()
-chat_agent = ChatAgent()
-reviewer_agent = ReviewerAgent()
+metrics.configure(config.get('metrics', {}).get('enabled', True))
+
+# Agents are built on first use or by the background warm-up, never at import time.
 # Scraper/Parser/Vector run on demand, not pre-loaded to save resources
+_AGENT_CLASSES = {
+    "summarizer": SummarizerAgent,
+    "chat": ChatAgent,
+    "reviewer": ReviewerAgent,
+}
+_agents: Dict[str, Any] = {}
+_agents_lock = threading.Lock()
+
+# Modules timed by the warm-up, in dependency order so each time is its own
+HEAVY_MODULES = ["numpy", "torch", "faiss", "fitz", "sentence_transformers"]
+# Owned by the retrieval sidecar when it is enabled (one copy of the model and index per host)
+RETRIEVAL_MODULES = {"torch", "faiss", "sentence_transformers"}
+
+startup_state: Dict[str, Any] = {"ready": False, "error": None, "report": {}}
+
+def get_agent(name: str):
+    """Return the shared agent instance, building it on first use."""
+    agent = _agents.get(name)
+    if agent is None:
+        with _agents_lock:
+            agent = _agents.get(name)
+            if agent is None:
+                agent = _AGENT_CLASSES[name]()
+                _agents[name] = agent
+    return agent
+
+def warm_up():
+    """Import heavy modules, build agents and load the embedding model, timing each step."""
+    report = {
+        "api_import_s": round(_API_IMPORTED - _BOOT_STARTED, 3),
+        "imports_s": {},
+        "agents_s": {},
+    }
+    use_sidecar = config['vector'].get('retrieval_service', {}).get('enabled', False)
+    try:
+        for module in HEAVY_MODULES:
+            if use_sidecar and module in RETRIEVAL_MODULES:
+                continue
+            start = time.perf_counter()
+            importlib.import_module(module)
+            report["imports_s"][module] = round(time.perf_counter() - start, 3)
+
+        for name in _AGENT_CLASSES:
+            start = time.perf_counter()
+            get_agent(name)
+            report["agents_s"][name] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        get_agent("chat").vector_agent.warm_up()
+        report["model_load_s"] = round(time.perf_counter() - start, 3)
+
+        startup_state["ready"] = True
+    except Exception as e:
+        startup_state["error"] = str(e)
+        logger.error(f"❌ Warm-up failed: {e}")
+    finally:
+        report["total_s"] = round(time.perf_counter() - _BOOT_STARTED, 3)
+        startup_state["report"] = report
+        logger.info(f"⏱️  Startup report: {json.dumps(report)}")
+
+def sync_search_index():
+    """Backfill the metadata search index (no-op when metadata.json is unchanged)."""
+    try:
+        sync_papers_from_metadata(os.path.join(config['data']['output_dir'], config['data']['metadata_file']))
+    except Exception as e:
+        logger.error(f"❌ Search index sync failed: {e}")
 
 # Lifespan Context Manager
 @asynccontextmanager
@@ -34,6 +113,13 @@ async def lifespan(app: FastAPI):
     # --- Startup Logic ---
     print("🚀 Starting up: Initializing database...")
     init_db()
+    # Search serves what is indexed so far while a large backfill runs
+    threading.Thread(target=sync_search_index, name="search-sync", daemon=True).start()
+    if config.get('api', {}).get('warmup', True):
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    else:
+        # Agents load lazily on the first request instead
+        startup_state["ready"] = True
     yield
     # --- Shutdown Logic (Optional) ---
     print("🛑 Shutting down...")
@@ -49,6 +135,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in per admin request (X-Profile: 1 or ?profile=1); not installed at all when disabled
+profile_store = None
+profile_admin_token = config.get('profiling', {}).get('admin_token') or None
+if config.get('profiling', {}).get('enabled', False):
+    profile_store = ProfileStore.from_config(config)
+    app.add_middleware(ProfilingMiddleware, store=profile_store,
+                       interval_ms=config['profiling'].get('sample_interval_ms', 5),
+                       admin_token=profile_admin_token)
+
+# Precomputed by the vector agent; follows the live snapshot generation
+paper_graph = PaperGraphStore(config) if config['vector'].get('related', {}).get('enabled', False) else None
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    """LLM queue is saturated: ask the client to back off instead of queueing forever"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    """Per-endpoint latency and status counts (skipped entirely when metrics are off)"""
+    if not metrics.enabled():
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.observe("http_request_seconds", time.perf_counter() - start, method=request.method, path=path)
+    metrics.inc("http_requests_total", method=request.method, path=path, status=response.status_code)
+    return response
+
 # --- Pydantic Models (define data formats) ---
 class PaperResponse(BaseModel):
     id: str
@@ -67,9 +187,11 @@ class ChatRequest(BaseModel):
     paper_id: str
     paper_title: str
     query: str
+    use_cache: bool = True  # Allow answering from the per-paper semantic cache
 
 class ReviewRequest(BaseModel):
     paper_title: str
+    paper_id: Optional[str] = None  # Enables the precomputed context pack lookup
 
 class BookmarkRequest(BaseModel):
     paper_id:str
@@ -77,6 +199,49 @@ class BookmarkRequest(BaseModel):
 
 # --- API Endpoints ---
 
+@app.get("/api/health")
+def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/api/ready")
+def readiness():
+    """Readiness probe: agents and the embedding model are loaded"""
+    if not startup_state["ready"]:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "starting", "error": startup_state["error"]},
+        )
+    return {"status": "ready", "startup": startup_state["report"]}
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of internal metrics"""
+    if not metrics.enabled():
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _require_profile_admin(request: Request):
+    if profile_store is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not is_admin(request.scope, profile_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/api/admin/profiles")
+def list_profiles(request: Request, limit: int = Query(20, ge=1, le=200)):
+    """Most recent saved profiles (newest first)"""
+    _require_profile_admin(request)
+    return profile_store.list(limit)
+
+@app.get("/api/admin/profiles/{file_name}")
+def download_profile(request: Request, file_name: str):
+    """Download a profile report (.json), folded stacks (.folded) or pstats dump (.prof)"""
+    _require_profile_admin(request)
+    path = profile_store.path(file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=file_name)
+
 @app.get("/api/papers", response_model=List[PaperResponse])
 def get_papers():
     """Get paper list"""
@@ -89,24 +254,53 @@ def get_papers():
         # Sort by time in reverse order
         return data[::-1]
 
+@app.get("/api/papers/search")
+def search_paper_metadata(
+    q: str = Query(..., min_length=1, description="Words to match; the last one is a prefix"),
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """Full-text search over title, abstract, authors and category (bm25-ranked, no embeddings)"""
+    results = search_papers(q, limit=limit, offset=offset, category=category)
+    return {"query": q, "count": len(results), "results": results}
+
+@app.get("/api/papers/{paper_id}/related")
+def get_related_papers(paper_id: str, limit: int = Query(10, ge=1, le=50)):
+    """Nearest papers by embedding centroid, plus the paper's topic cluster (precomputed at index time)"""
+    related = paper_graph.related(paper_id, limit) if paper_graph is not None else None
+    if related is None:
+        raise HTTPException(status_code=404, detail="Paper not found in the related-papers graph")
+    return related
+
 @app.post("/api/refresh")
 def refresh_data():
     """Trigger scraper and parsing pipeline"""
     try:
         # Execute Pipeline in sequence
-        ScraperAgent().run()
-        ParserAgent().run()
-        VectorAgent().create_index()
-        return {"status": "success", "message": "Pipeline completed successfully"}
+        with metrics.span("refresh_stage", stage="scrape"):
+            ScraperAgent().run()
+        with metrics.span("refresh_stage", stage="parse"):
+            parse_report = ParserAgent().run()
+        with metrics.span("refresh_stage", stage="index"):
+            VectorAgent().create_index()
+        # Cached answers were built on the old index
+        if "chat" in _agents and _agents["chat"].answer_cache is not None:
+            _agents["chat"].answer_cache.invalidate()
+        metrics.inc("refresh_runs_total", status="success")
+        return {"status": "success", "message": "Pipeline completed successfully", "parse_report": parse_report}
     except Exception as e:
+        metrics.inc("refresh_runs_total", status="error")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/summarize")
 def generate_summary(req: SummaryRequest):
     """Generate summary"""
     try:
-        result = summarizer_agent.generate_summary(req.paper_id, mode=req.mode)
+        result = get_agent("summarizer").generate_summary(req.paper_id, mode=req.mode)
         return {"paper_id": req.paper_id, "summary": result}
+    except QueueFullError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -127,34 +321,44 @@ def get_paper_chat_history(paper_id: str):
     return get_chat_history(paper_id)
 
 @app.post("/api/chat")
-def chat_with_paper(req: ChatRequest):
+def chat_with_paper(req: ChatRequest, background_tasks: BackgroundTasks):
     """
     Interactive chat endpoint for a specific paper.
     """
     try:
-		# Load History from DB
-        history = get_chat_history(req.paper_id)
+		# Load History from DB: rolling summary + the turns it does not cover yet
+        memory = get_chat_memory(req.paper_id)
+        chat_agent = get_agent("chat")
 
 		# Generate Response
         result = chat_agent.chat(
             paper_id=req.paper_id,
             paper_title=req.paper_title,
             query=req.query,
-            history=history
+            history=memory["messages"],
+            use_cache=req.use_cache,
+            summary=memory["summary"]
         )
 
         response_text = result["content"]
         sources = result["sources"]
 
-		# Save Context (Persistence + Cap)
-        add_chat_message(req.paper_id, "user", req.query)
-        add_chat_message(req.paper_id, "assistant", response_text)
+		# Save Context (Persistence + Cap; with memory on, only turns already summarized are trimmed)
+        summarized_only = chat_agent.memory is not None
+        add_chat_message(req.paper_id, "user", req.query, only_summarized=summarized_only)
+        add_chat_message(req.paper_id, "assistant", response_text, only_summarized=summarized_only)
+
+		# Summarize older turns after the response is sent, once they exceed the token threshold
+        background_tasks.add_task(chat_agent.compact_memory, req.paper_id, req.paper_title)
 
         return {
             "response": response_text,
-            "sources": sources
+            "sources": sources,
+            "cached": result.get("cached", False)
         }
 
+    except QueueFullError:
+        raise
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -166,8 +370,10 @@ def review_paper(req: ReviewRequest):
     This serves as the 'opening' for the chat session.
     """
     try:
-        report = reviewer_agent.review(req.paper_title)
+        report = get_agent("reviewer").review(req.paper_title, paper_id=req.paper_id)
         return {"response": report}
+    except QueueFullError:
+        raise
     except Exception as e:
         print(f"Error generating review: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,110 @@
+"""
+Rolling conversation summaries for chat.
+
+Each chat prompt carries the paper's rolling summary plus only the newest
+turns (within a token budget), so prompt size stays flat as a conversation
+grows. Once the turns the summary does not cover yet exceed a token
+threshold, the older ones are folded into the summary by a low-priority
+("batch") LLM call that runs after the response has been sent.
+"""
+import threading
+from loguru import logger
+from typing import Dict, Any, List, Optional
+
+from context_packs import CHARS_PER_TOKEN
+from database import get_chat_memory, save_chat_summary
+import metrics
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and a research assistant about the paper "{title}".
+
+Update the summary with the new turns below. Keep every fact, number, conclusion and open question that later turns may refer to, and note what the user is interested in. Drop greetings and repetition. Write plain prose, at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class ConversationMemory:
+    def __init__(self, llm, model: str, compact_threshold_tokens: int = 1500, keep_recent: int = 4,
+                 recent_token_budget: int = 1500, summary_max_words: int = 250):
+        self.llm = llm
+        self.model = model
+        self.compact_threshold_tokens = compact_threshold_tokens
+        self.keep_recent = keep_recent
+        self.recent_token_budget = recent_token_budget
+        self.summary_max_words = summary_max_words
+        self._compacting = set()  # Papers with a compaction in flight
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, memory_config: Dict[str, Any], llm, model: str) -> "ConversationMemory":
+        return cls(
+            llm, model,
+            compact_threshold_tokens=memory_config.get('compact_threshold_tokens', 1500),
+            keep_recent=memory_config.get('keep_recent', 4),
+            recent_token_budget=memory_config.get('recent_token_budget', 1500),
+            summary_max_words=memory_config.get('summary_max_words', 250),
+        )
+
+    def prompt_messages(self, summary: Optional[str], history: List[Dict]) -> List[Dict]:
+        """The summary (as a system note) plus the newest turns that fit in the budget."""
+        recent, used = [], 0
+        for message in reversed(history):
+            used += estimate_tokens(message['content'])
+            if recent and used > self.recent_token_budget:
+                break
+            recent.append({"role": message['role'], "content": message['content']})
+        recent.reverse()
+
+        messages = []
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        return messages + recent
+
+    def needs_compaction(self, history: List[Dict]) -> bool:
+        return len(history) > self.keep_recent and \
+            sum(estimate_tokens(m['content']) for m in history) > self.compact_threshold_tokens
+
+    def compact(self, paper_id: str, paper_title: str) -> bool:
+        """Fold all but the newest `keep_recent` unsummarized turns into the summary (background task)."""
+        with self._lock:
+            if paper_id in self._compacting:
+                return False
+            self._compacting.add(paper_id)
+        try:
+            memory = get_chat_memory(paper_id)
+            history = memory['messages']
+            if not self.needs_compaction(history):
+                return False
+
+            folded = history[:-self.keep_recent] if self.keep_recent else history
+            turns = "\n\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in folded)
+            prompt = SUMMARY_PROMPT.format(title=paper_title, max_words=self.summary_max_words,
+                                           summary=memory['summary'] or "(none yet)", turns=turns)
+            with metrics.span("chat_summary"):
+                response = self.llm.chat(self.model, [{"role": "user", "content": prompt}],
+                                         priority="batch", agent="chat_memory")
+            summary = response['message']['content'].strip()
+            if not summary:
+                return False
+
+            saved = save_chat_summary(paper_id, summary, covers_until=folded[-1]['id'])
+            if saved:
+                logger.info(f"🗜️  Folded {len(folded)} chat turns for {paper_id} into the rolling summary "
+                            f"(~{estimate_tokens(turns)} -> ~{estimate_tokens(summary)} tokens)")
+            return saved
+        except Exception as e:
+            # Best effort: the next turn retries, and prompts stay bounded by the recent-turn budget meanwhile
+            logger.warning(f"⚠️ Chat summary for {paper_id} failed: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._compacting.discard(paper_id)
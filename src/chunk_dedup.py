@@ -0,0 +1,137 @@
+"""
+MinHash/LSH near-duplicate detection for chunks, run between parsing and
+embedding.
+
+- Near-duplicate chunks (within or across papers) collapse to one vector;
+  the other occurrences are kept as aliases so paper-filtered search and
+  citations still resolve to every paper that contains the text.
+- Clusters that span many papers (license footers, running headers,
+  acknowledgement templates) are boilerplate and are not embedded at all.
+"""
+import re
+import zlib
+import numpy as np
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple, Optional
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+class DedupResult:
+    def __init__(self, total: int):
+        self.total = total
+        self.kept: List[int] = []                       # indices of chunks to embed
+        self.aliases: Dict[int, List[int]] = {}         # kept index -> other indices it stands for
+        self.boilerplate = 0
+        self.near_duplicates = 0
+
+    @property
+    def removed(self) -> int:
+        return self.total - len(self.kept)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "total_chunks": self.total,
+            "embedded_chunks": len(self.kept),
+            "removed_chunks": self.removed,
+            "near_duplicates": self.near_duplicates,
+            "boilerplate": self.boilerplate,
+        }
+
+
+class ChunkDeduplicator:
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, bands: int = 16,
+                 shingle_words: int = 5, boilerplate_min_papers: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        self.boilerplate_min_papers = boilerplate_min_papers
+
+        rng = np.random.default_rng(seed)
+        # a < 2^31 and shingle hashes < 2^32 keep a*x + b inside uint64
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    @classmethod
+    def from_config(cls, dedup_config: Dict[str, Any]) -> "ChunkDeduplicator":
+        return cls(
+            threshold=dedup_config.get('threshold', 0.85),
+            num_perm=dedup_config.get('num_perm', 64),
+            bands=dedup_config.get('bands', 16),
+            shingle_words=dedup_config.get('shingle_words', 5),
+            boilerplate_min_papers=dedup_config.get('boilerplate_min_papers', 5),
+        )
+
+    def _shingles(self, text: str) -> np.ndarray:
+        words = _WORD_RE.findall(text.lower())
+        if not words:
+            return np.empty(0, dtype=np.uint64)
+        n = self.shingle_words
+        grams = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature, or None for text without words (never treated as a duplicate)"""
+        shingles = self._shingles(text)
+        if shingles.size == 0:
+            return None
+        hashed = (self._a[:, None] * shingles[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return hashed.min(axis=1)
+
+    def dedup(self, chunks: List[Tuple[str, str]]) -> DedupResult:
+        """
+        `chunks` is a list of (paper_id, text). Returns which indices to embed
+        and which indices each kept chunk also stands for.
+        """
+        result = DedupResult(len(chunks))
+        sigs = [self.signature(text) for _, text in chunks]
+        # Wordless chunks (tables of symbols, page numbers) get a placeholder row and skip LSH
+        hashed = [i for i, sig in enumerate(sigs) if sig is not None]
+        signatures = np.stack([sig if sig is not None else np.zeros(self.num_perm, dtype=np.uint64) for sig in sigs]) \
+            if chunks else np.empty((0, self.num_perm))
+
+        # LSH: chunks sharing any band are candidate pairs
+        parent = list(range(len(chunks)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for band in range(self.bands):
+            buckets: Dict[bytes, List[int]] = defaultdict(list)
+            band_sigs = signatures[:, band * self.rows:(band + 1) * self.rows]
+            for i in hashed:
+                buckets[band_sigs[i].tobytes()].append(i)
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                head = members[0]
+                for other in members[1:]:
+                    root_a, root_b = find(head), find(other)
+                    if root_a == root_b:
+                        continue
+                    if np.mean(signatures[head] == signatures[other]) >= self.threshold:
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        clusters: Dict[int, List[int]] = defaultdict(list)
+        for i in range(len(chunks)):
+            clusters[find(i)].append(i)
+
+        for root in sorted(clusters):
+            members = clusters[root]
+            papers = {chunks[i][0] for i in members}
+            if len(papers) >= self.boilerplate_min_papers:
+                result.boilerplate += len(members)
+                continue
+            result.kept.append(members[0])
+            if len(members) > 1:
+                result.aliases[members[0]] = members[1:]
+                result.near_duplicates += len(members) - 1
+        return result
@@ -0,0 +1,152 @@
+"""
+Per-paper key-section context packs.
+
+During parsing, section headings (abstract, method, results, limitations,
+conclusion, ...) are detected in the raw PDF text and a token-budgeted
+context is stored per paper and prompt mode. Summary and review prompts are
+then built from one dictionary lookup instead of a vector search.
+"""
+import os
+import re
+import json
+import threading
+from loguru import logger
+from typing import Dict, List, Optional, Callable
+
+# Heading text -> canonical section
+SECTION_ALIASES = {
+    "abstract": "abstract",
+    "introduction": "introduction",
+    "background": "introduction",
+    "method": "method",
+    "methods": "method",
+    "methodology": "method",
+    "approach": "method",
+    "proposed method": "method",
+    "our approach": "method",
+    "model": "method",
+    "framework": "method",
+    "experiments": "results",
+    "experiment": "results",
+    "experimental results": "results",
+    "experimental setup": "results",
+    "evaluation": "results",
+    "results": "results",
+    "results and discussion": "results",
+    "discussion": "limitations",
+    "limitations": "limitations",
+    "limitation": "limitations",
+    "limitations and future work": "limitations",
+    "conclusion": "conclusion",
+    "conclusions": "conclusion",
+    "conclusion and future work": "conclusion",
+    "conclusions and future work": "conclusion",
+    "future work": "conclusion",
+    "related work": "related_work",
+}
+
+# Words that also end up alone on a line in running text (wrapped sentences, figure
+# labels): only headings when numbered ("4 Model") or set in capitals ("DISCUSSION")
+AMBIGUOUS_ALIASES = {"model", "framework", "discussion"}
+
+# Sections used for each prompt mode, in prompt order
+DEFAULT_PACK_SECTIONS = {
+    "quick_summary": ["method", "results", "conclusion"],
+    "detailed_report": ["introduction", "method", "results", "limitations", "conclusion"],
+    "review": ["abstract", "method", "results", "limitations", "conclusion"],
+}
+
+DEFAULT_TOKEN_BUDGETS = {"quick_summary": 1000, "detailed_report": 2500, "review": 1800}
+CHARS_PER_TOKEN = 4
+
+# Optional numbering ("3", "3.1", "III.") followed by a known heading, alone on its line
+_HEADING_RE = re.compile(
+    r"^\s*((?:\d+(?:\.\d+)*|[IVX]+)\.?\s+)?(" + "|".join(
+        re.escape(alias) for alias in sorted(SECTION_ALIASES, key=len, reverse=True)
+    ) + r")\s*:?\s*$",
+    re.IGNORECASE,
+)
+
+
+def detect_sections(raw_text: str, clean: Callable[[str], str]) -> Dict[str, str]:
+    """Split raw (newline-preserving) PDF text into canonical sections."""
+    sections: Dict[str, List[str]] = {}
+    current = None
+    for line in raw_text.split("\n"):
+        match = _HEADING_RE.match(line) if len(line) < 80 else None
+        if match and match.group(2).lower() in AMBIGUOUS_ALIASES \
+                and not match.group(1) and not match.group(2).isupper():
+            match = None
+        if match:
+            current = SECTION_ALIASES[match.group(2).lower()]
+            sections.setdefault(current, [])
+            continue
+        if current is not None:
+            sections[current].append(line)
+    return {name: clean("\n".join(lines)) for name, lines in sections.items() if lines}
+
+
+def build_pack(sections: Dict[str, str], section_names: List[str], token_budget: int,
+               fallback_text: str = "") -> str:
+    """Fill the budget from the requested sections, giving short sections their full text first."""
+    budget = token_budget * CHARS_PER_TOKEN
+    present = [name for name in section_names if sections.get(name)]
+    if not present:
+        return fallback_text[:budget]
+
+    allocation = {}
+    remaining = budget
+    for i, name in enumerate(sorted(present, key=lambda n: len(sections[n]))):
+        share = remaining // (len(present) - i)
+        allocation[name] = min(len(sections[name]), share)
+        remaining -= allocation[name]
+
+    return "\n\n".join(f"[{name.replace('_', ' ').title()}]\n{sections[name][:allocation[name]]}"
+                       for name in present)
+
+
+def build_packs(sections: Dict[str, str], config: Dict, fallback_text: str = "") -> Dict[str, str]:
+    pack_config = config.get('parser', {}).get('context_packs', {})
+    budgets = {**DEFAULT_TOKEN_BUDGETS, **pack_config.get('token_budgets', {})}
+    return {
+        mode: build_pack(sections, names, budgets[mode], fallback_text)
+        for mode, names in DEFAULT_PACK_SECTIONS.items()
+    }
+
+
+class ContextPackStore:
+    """Read side: lazily (re)loads the packs file when it changes on disk."""
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._packs: Dict[str, Dict] = {}
+        self._by_title: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "ContextPackStore":
+        file_name = config.get('parser', {}).get('context_packs', {}).get('output_file', "context_packs.json")
+        return cls(os.path.join(config['data']['output_dir'], file_name))
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._packs = json.load(f)
+            self._by_title = {entry['title'].strip().lower(): pid for pid, entry in self._packs.items()}
+            self._mtime = mtime
+            logger.info(f"📚 Loaded context packs for {len(self._packs)} papers.")
+
+    def get(self, paper_id: Optional[str], mode: str) -> Optional[str]:
+        self._refresh()
+        entry = self._packs.get(paper_id) if paper_id else None
+        return entry['packs'].get(mode) if entry else None
+
+    def get_by_title(self, title: str, mode: str) -> Optional[str]:
+        self._refresh()
+        return self.get(self._by_title.get(title.strip().lower()), mode)
@@ -1,16 +1,34 @@
 import sqlite3
 import os
-from typing import List, Dict
+import re
+import threading
+import html
+import json
+from typing import List, Dict, Optional
 from loguru import logger
+import metrics
 
 DB_PATH = "data/user_library.db"
 MAX_HISTORY = 20  # 🎯 Linus 建議：設定對話記憶上限
+SUMMARY_ROLE = "summary"  # One rolling summary row per paper; not part of the visible history or the cap
 
 def get_db_connection():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row  # 讓我們可以用 dict 的方式存取欄位
     return conn
 
+_local = threading.local()
+
+def _get_search_connection():
+    """
+    Long-lived read connection per thread for search: a fresh connection
+    re-parses the schema and FTS5 structure, which costs more than the query.
+    """
+    conn = getattr(_local, "search_conn", None)
+    if conn is None:
+        conn = _local.search_conn = get_db_connection()
+    return conn
+
 def init_db():
     """Initialize the SQLite database with simple tables."""
     # Ensure data directory exists
@@ -41,6 +59,17 @@ def init_db():
     
     # Create index for faster lookup
     c.execute('CREATE INDEX IF NOT EXISTS idx_chat_paper_id ON chat_history(paper_id)')
+
+    # Rolling summaries record the last message id they fold in (added to existing databases)
+    columns = {row['name'] for row in c.execute('PRAGMA table_info(chat_history)')}
+    if 'covers_until' not in columns:
+        c.execute('ALTER TABLE chat_history ADD COLUMN covers_until INTEGER')
+
+    # 3. Paper metadata + FTS5 search index
+    _create_paper_tables(c)
+
+    # Readers (search) are not blocked while the scraper writes
+    c.execute('PRAGMA journal_mode=WAL')
     
     conn.commit()
     conn.close()
@@ -48,6 +77,7 @@ def init_db():
 
 # === Bookmark Operations ===
 
+@metrics.timed("db_call", op="toggle_bookmark")
 def toggle_bookmark(paper_id: str, title: str) -> bool:
     """
     Toggle bookmark status. Returns True if added, False if removed.
@@ -77,6 +107,7 @@ def toggle_bookmark(paper_id: str, title: str) -> bool:
     finally:
         conn.close()
 
+@metrics.timed("db_call", op="get_all_bookmarks")
 def get_all_bookmarks() -> List[str]:
     """Get list of all bookmarked paper IDs."""
     conn = get_db_connection()
@@ -88,9 +119,13 @@ def get_all_bookmarks() -> List[str]:
 
 # === Chat History Operations (with Cap) ===
 
-def add_chat_message(paper_id: str, role: str, content: str):
+@metrics.timed("db_call", op="add_chat_message")
+def add_chat_message(paper_id: str, role: str, content: str, only_summarized: bool = False):
     """
     Add a message and enforce history limit (Linus's Rule #2).
+
+    With `only_summarized`, the cap only removes turns the rolling summary
+    already covers, so turns are never lost while summarizing lags behind.
     """
     conn = get_db_connection()
     c = conn.cursor()
@@ -102,22 +137,29 @@ def add_chat_message(paper_id: str, role: str, content: str):
             (paper_id, role, content)
         )
         
-        # 2. Enforce Cap: Check count
-        c.execute('SELECT count(*) FROM chat_history WHERE paper_id = ?', (paper_id,))
+        # 2. Enforce Cap: Check count (the rolling summary does not count)
+        c.execute('SELECT count(*) FROM chat_history WHERE paper_id = ? AND role != ?', (paper_id, SUMMARY_ROLE))
         count = c.fetchone()[0]
         
         if count > MAX_HISTORY:
+            # -1 = plain cap; otherwise trim up to the summary's last covered turn (0 = no summary yet)
+            covers_until = -1
+            if only_summarized:
+                c.execute('SELECT covers_until FROM chat_history WHERE paper_id = ? AND role = ?',
+                          (paper_id, SUMMARY_ROLE))
+                row = c.fetchone()
+                covers_until = row['covers_until'] if row and row['covers_until'] else 0
             # ✂️ Remove oldest messages, keep top MAX_HISTORY
             # SQLite specific syntax to delete oldest
             c.execute('''
                 DELETE FROM chat_history 
                 WHERE id IN (
                     SELECT id FROM chat_history 
-                    WHERE paper_id = ? 
+                    WHERE paper_id = ? AND role != ? AND (? < 0 OR id <= ?)
                     ORDER BY id ASC 
                     LIMIT ?
                 )
-            ''', (paper_id, count - MAX_HISTORY))
+            ''', (paper_id, SUMMARY_ROLE, covers_until, covers_until, count - MAX_HISTORY))
             
         conn.commit() # ✅ Atomic Commit
     except Exception as e:
@@ -126,12 +168,248 @@ def add_chat_message(paper_id: str, role: str, content: str):
     finally:
         conn.close()
 
+@metrics.timed("db_call", op="get_chat_history")
 def get_chat_history(paper_id: str) -> List[Dict]:
     """Retrieve history for context window."""
     conn = get_db_connection()
     c = conn.cursor()
     # Order by ID ensures chronological order
-    c.execute('SELECT role, content FROM chat_history WHERE paper_id = ? ORDER BY id ASC', (paper_id,))
+    c.execute('SELECT role, content FROM chat_history WHERE paper_id = ? AND role != ? ORDER BY id ASC',
+              (paper_id, SUMMARY_ROLE))
     rows = c.fetchall()
     conn.close()
     return [{"role": row['role'], "content": row['content']} for row in rows]
+
+@metrics.timed("db_call", op="get_chat_memory")
+def get_chat_memory(paper_id: str) -> Dict:
+    """Rolling summary (if any) plus the messages it does not cover yet, oldest first."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('SELECT content, covers_until FROM chat_history WHERE paper_id = ? AND role = ?',
+              (paper_id, SUMMARY_ROLE))
+    summary = c.fetchone()
+    covers_until = summary['covers_until'] if summary else 0
+    c.execute('SELECT id, role, content FROM chat_history WHERE paper_id = ? AND role != ? AND id > ? ORDER BY id ASC',
+              (paper_id, SUMMARY_ROLE, covers_until))
+    rows = c.fetchall()
+    conn.close()
+    return {
+        "summary": summary['content'] if summary else None,
+        "covers_until": covers_until,
+        "messages": [{"id": row['id'], "role": row['role'], "content": row['content']} for row in rows],
+    }
+
+@metrics.timed("db_call", op="save_chat_summary")
+def save_chat_summary(paper_id: str, content: str, covers_until: int) -> bool:
+    """Replace the paper's rolling summary, unless a newer one has been saved meanwhile."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    
+    try:
+        c.execute('SELECT id, covers_until FROM chat_history WHERE paper_id = ? AND role = ?',
+                  (paper_id, SUMMARY_ROLE))
+        existing = c.fetchone()
+        if existing and existing['covers_until'] >= covers_until:
+            return False
+        if existing:
+            c.execute('UPDATE chat_history SET content = ?, covers_until = ?, created_at = CURRENT_TIMESTAMP '
+                      'WHERE id = ?', (content, covers_until, existing['id']))
+        else:
+            c.execute('INSERT INTO chat_history (paper_id, role, content, covers_until) VALUES (?, ?, ?, ?)',
+                      (paper_id, SUMMARY_ROLE, content, covers_until))
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Database error (chat summary): {e}")
+        return False
+    finally:
+        conn.close()
+
+# === Paper Metadata Search (FTS5) ===
+
+# Column weights for bm25(): title, summary, authors, category
+_BM25_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
+_TERM_RE = re.compile(r"\w+\*?")
+
+def _create_paper_tables(c: sqlite3.Cursor):
+    """Papers table plus an external-content FTS5 index kept in sync by triggers."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS papers (
+            id INTEGER PRIMARY KEY,
+            paper_id TEXT UNIQUE NOT NULL,
+            title TEXT,
+            summary TEXT,
+            authors TEXT,
+            category TEXT,
+            published TEXT,
+            pdf_url TEXT,
+            authors_json TEXT
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_papers_category ON papers(category)')
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+            title, summary, authors, category,
+            content='papers', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3 4'
+        )
+    ''')
+    c.executescript('''
+        CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+            INSERT INTO papers_fts(rowid, title, summary, authors, category)
+            VALUES (new.id, new.title, new.summary, new.authors, new.category);
+        END;
+        CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+            INSERT INTO papers_fts(papers_fts, rowid, title, summary, authors, category)
+            VALUES ('delete', old.id, old.title, old.summary, old.authors, old.category);
+        END;
+        CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+            INSERT INTO papers_fts(papers_fts, rowid, title, summary, authors, category)
+            VALUES ('delete', old.id, old.title, old.summary, old.authors, old.category);
+            INSERT INTO papers_fts(rowid, title, summary, authors, category)
+            VALUES (new.id, new.title, new.summary, new.authors, new.category);
+        END;
+    ''')
+    c.execute('CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)')
+
+@metrics.timed("db_call", op="upsert_papers")
+def upsert_papers(papers: List[Dict]) -> int:
+    """
+    Insert or update scraped papers in the search index. Unchanged rows are
+    left alone, so the FTS triggers only reindex what changed. Returns the
+    number of rows written.
+    """
+    if not papers:
+        return 0
+    conn = get_db_connection()
+    c = conn.cursor()
+
+    try:
+        _create_paper_tables(c)
+        c.executemany('''
+            INSERT INTO papers (paper_id, title, summary, authors, category, published, pdf_url, authors_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(paper_id) DO UPDATE SET
+                title = excluded.title, summary = excluded.summary, authors = excluded.authors,
+                category = excluded.category, published = excluded.published,
+                pdf_url = excluded.pdf_url, authors_json = excluded.authors_json
+            WHERE title IS NOT excluded.title OR summary IS NOT excluded.summary
+                OR authors IS NOT excluded.authors OR category IS NOT excluded.category
+                OR published IS NOT excluded.published OR pdf_url IS NOT excluded.pdf_url
+                OR authors_json IS NOT excluded.authors_json
+        ''', [(
+            p['id'], p.get('title', ""), p.get('summary', ""), ", ".join(p.get('authors', [])),
+            p.get('primary_category', ""), p.get('published', ""), p.get('pdf_url', ""),
+            json.dumps(p.get('authors', []), ensure_ascii=False),
+        ) for p in papers])
+        written = c.rowcount  # Rows inserted or updated (skipped no-op updates are not counted)
+        conn.commit() # ✅ Atomic Commit
+        return written
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Database error (papers): {e}")
+        raise
+    finally:
+        conn.close()
+
+@metrics.timed("db_call", op="sync_papers")
+def sync_papers_from_metadata(metadata_path: str) -> int:
+    """
+    Backfill the search index from metadata.json. Skipped when the file has
+    not changed since the last sync (e.g. on every restart).
+    """
+    if not os.path.exists(metadata_path):
+        return 0
+    stat = os.stat(metadata_path)
+    signature = f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT value FROM sync_state WHERE key = 'metadata'").fetchone()
+    finally:
+        conn.close()
+    if row and row['value'] == signature:
+        return 0
+
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        papers = json.load(f)
+    written = upsert_papers(papers)
+
+    conn = get_db_connection()
+    try:
+        conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('metadata', ?)", (signature,))
+        conn.commit()
+    finally:
+        conn.close()
+    logger.info(f"🔎 Search index synced with {written} papers from {metadata_path}")
+    return written
+
+def _query_terms(query: str) -> List[tuple]:
+    """(word, is_prefix) per term; the last term is a prefix (search-as-you-type) unless the query ends with a space."""
+    terms = _TERM_RE.findall(query)
+    return [(term.rstrip("*"), term.endswith("*") or (i == len(terms) - 1 and not query[-1:].isspace()))
+            for i, term in enumerate(terms)]
+
+def _fts_query(terms: List[tuple]) -> Optional[str]:
+    """Terms -> FTS5 MATCH expression: all terms must match (AND), quoted so punctuation cannot break the syntax."""
+    if not terms:
+        return None
+    return " ".join(f'"{word}"' + ("*" if prefix else "") for word, prefix in terms)
+
+def _mark(text: str, pattern: re.Pattern) -> str:
+    """HTML-escape `text` and wrap query hits in <mark>."""
+    return pattern.sub(lambda m: f"<mark>{m.group(0)}</mark>", html.escape(text))
+
+def _snippet(text: str, pattern: re.Pattern, chars: int = 200) -> str:
+    """About `chars` characters of `text` around the first query hit, with hits marked."""
+    hit = pattern.search(text)
+    start = max(0, (hit.start() if hit else 0) - chars // 3)
+    if start:
+        start = text.find(" ", start) + 1 or start  # Do not cut a word in half
+    end = text.rfind(" ", start, start + chars) if start + chars < len(text) else len(text)
+    end = end if end > start else start + chars
+    return ("…" if start else "") + _mark(text[start:end], pattern) + ("…" if end < len(text) else "")
+
+@metrics.timed("db_call", op="search_papers")
+def search_papers(query: str, limit: int = 20, offset: int = 0, category: Optional[str] = None) -> List[Dict]:
+    """
+    bm25-ranked metadata search with highlighted title and abstract snippet.
+
+    Every match is ranked, so results do not depend on insertion order; only
+    the requested page is joined back to the papers table. Highlighting is
+    done in Python on the returned page only; FTS5's snippet() would
+    re-expand prefix terms for every row.
+    """
+    terms = _query_terms(query)
+    match = _fts_query(terms)
+    if match is None:
+        return []
+
+    # The category is compared exactly on the papers row (an FTS phrase match on
+    # "cs" would also hit every cs.* paper) and filtered before the page is cut
+    rows = _get_search_connection().execute(f'''
+        SELECT p.paper_id, p.title, p.summary, p.authors_json, p.category, p.published, p.pdf_url, c.score
+        FROM (
+            SELECT f.rowid, bm25(papers_fts, {", ".join(map(str, _BM25_WEIGHTS))}) AS score
+            FROM papers_fts f JOIN papers cp ON cp.id = f.rowid
+            WHERE papers_fts MATCH ? AND (? IS NULL OR cp.category = ?)
+            ORDER BY score LIMIT ? OFFSET ?
+        ) AS c JOIN papers p ON p.id = c.rowid
+        ORDER BY c.score
+    ''', (match, category or None, category or None, limit, offset)).fetchall()
+
+    pattern = re.compile("|".join(r"\b" + re.escape(word) + (r"\w*" if prefix else r"\b")
+                                  for word, prefix in terms), re.IGNORECASE)
+    return [{
+        "id": row['paper_id'],
+        "title": row['title'],
+        "authors": json.loads(row['authors_json'] or "[]"),
+        "primary_category": row['category'],
+        "published": row['published'],
+        "pdf_url": row['pdf_url'],
+        "title_highlight": _mark(row['title'] or "", pattern),
+        "snippet": _snippet(row['summary'] or "", pattern),
+        "score": -row['score'],  # bm25() is lower-is-better
+    } for row in rows]
@@ -0,0 +1,231 @@
+"""
+Content-addressed document store for raw PDFs and extracted text.
+
+Layout under `root`:
+
+    blobs/<h[:2]>/<h>.pdf   raw PDF, named by the SHA-256 of its bytes
+    blobs/<h[:2]>/<h>.txt   extracted text, compressed in independent frames
+    refs.json               paper id -> {pdf, text, chunking params, ...}
+
+Identical PDFs or texts (e.g. arXiv v1/v2 with unchanged content) are stored
+once. Text blobs are split into fixed-size frames compressed separately
+(zstd when `zstandard` is installed, zlib otherwise), so a single chunk is
+read by decompressing only the frames that cover it.
+"""
+import os
+import json
+import zlib
+import shutil
+import struct
+import hashlib
+import tempfile
+import threading
+import requests
+from loguru import logger
+from typing import Dict, Any, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # zlib fallback keeps the store usable without the extra package
+    zstandard = None
+
+_MAGIC = b"ATX1"
+_CODEC_ZLIB = 1
+_CODEC_ZSTD = 2
+_TEXT_HEADER = struct.Struct("!4sBII")  # magic, codec, frame_chars, n_frames
+
+
+class DocumentStore:
+    def __init__(self, root: str, frame_chars: int = 16384, level: int = 3):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.refs_path = os.path.join(root, "refs.json")
+        self.frame_chars = frame_chars
+        self.level = level
+        self._lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.refs: Dict[str, Dict[str, Any]] = self._load_refs()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "DocumentStore":
+        store_config = config.get('store', {})
+        return cls(
+            os.path.join(config['data']['output_dir'], store_config.get('dir', "store")),
+            frame_chars=store_config.get('frame_chars', 16384),
+            level=store_config.get('compression_level', 3),
+        )
+
+    # --- Refs ---
+
+    def _load_refs(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.refs_path):
+            return {}
+        with open(self.refs_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_refs(self):
+        with self._lock:
+            temp_path = f"{self.refs_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.refs, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.refs_path)
+
+    def get_ref(self, paper_id: str) -> Optional[Dict[str, Any]]:
+        return self.refs.get(paper_id)
+
+    def set_ref(self, paper_id: str, **fields):
+        with self._lock:
+            self.refs.setdefault(paper_id, {}).update(fields)
+
+    # --- Blobs ---
+
+    def _blob_path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.{ext}")
+
+    def has_blob(self, digest: str, ext: str) -> bool:
+        return os.path.exists(self._blob_path(digest, ext))
+
+    def put_pdf(self, file_path: str, move: bool = True) -> str:
+        """Add a PDF file; with `move` the original is removed once stored."""
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+
+        target = self._blob_path(digest, "pdf")
+        if os.path.exists(target):
+            if move:
+                os.remove(file_path)  # Duplicate content (e.g. unchanged new version)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            (shutil.move if move else shutil.copyfile)(file_path, target)
+        return digest
+
+    def pdf_path(self, digest: str) -> str:
+        return self._blob_path(digest, "pdf")
+
+    def _compress(self, data: bytes) -> bytes:
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return zlib.compress(data, min(self.level * 2, 9))
+
+    @staticmethod
+    def _decompress(codec: int, data: bytes) -> bytes:
+        if codec == _CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Blob is zstd-compressed but `zstandard` is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def put_text(self, text: str) -> str:
+        """Store text as independently compressed frames; returns its content hash."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        target = self._blob_path(digest, "txt")
+        if os.path.exists(target):
+            return digest
+
+        frames = [self._compress(text[i:i + self.frame_chars].encode("utf-8"))
+                  for i in range(0, len(text), self.frame_chars)]
+        codec = _CODEC_ZSTD if zstandard is not None else _CODEC_ZLIB
+        offsets, position = [], 0
+        for frame in frames:
+            offsets.append(position)
+            position += len(frame)
+        offsets.append(position)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(target), delete=False) as f:
+            f.write(_TEXT_HEADER.pack(_MAGIC, codec, self.frame_chars, len(frames)))
+            f.write(struct.pack(f"!{len(offsets)}Q", *offsets))
+            for frame in frames:
+                f.write(frame)
+        os.replace(f.name, target)
+        return digest
+
+    def get_range(self, digest: str, start: int, end: int) -> str:
+        """Return text[start:end] (in characters), decompressing only the covering frames."""
+        with open(self._blob_path(digest, "txt"), 'rb') as f:
+            magic, codec, frame_chars, n_frames = _TEXT_HEADER.unpack(f.read(_TEXT_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"Not a text blob: {digest}")
+            offsets = struct.unpack(f"!{n_frames + 1}Q", f.read(8 * (n_frames + 1)))
+            data_start = f.tell()
+
+            first = start // frame_chars
+            last = min((max(end, start + 1) - 1) // frame_chars, n_frames - 1)
+            if first >= n_frames:
+                return ""
+            f.seek(data_start + offsets[first])
+            raw = f.read(offsets[last + 1] - offsets[first])
+
+        text = "".join(
+            self._decompress(codec, raw[offsets[i] - offsets[first]:offsets[i + 1] - offsets[first]]).decode("utf-8")
+            for i in range(first, last + 1)
+        )
+        base = first * frame_chars
+        return text[start - base:end - base]
+
+    def get_text(self, digest: str) -> str:
+        return self.get_range(digest, 0, 1 << 62)
+
+    # --- Papers ---
+
+    def get_chunk(self, paper_id: str, chunk_index: int) -> str:
+        """Random access to one chunk of a paper's extracted text."""
+        ref = self.refs[paper_id]
+        start = chunk_index * ref['chunk_step']
+        return self.get_range(ref['text'], start, start + ref['chunk_size'])
+
+    def get_chunks(self, paper_id: str) -> List[str]:
+        ref = self.refs[paper_id]
+        text = self.get_text(ref['text'])
+        return [text[i * ref['chunk_step']:i * ref['chunk_step'] + ref['chunk_size']]
+                for i in range(ref['total_chunks'])]
+
+    def ensure_pdf(self, paper: Dict[str, Any], timeout: int = 30) -> Optional[str]:
+        """
+        Return a readable PDF path for a paper: the stored blob, the scraper's
+        local file (moved into the store), or a fresh download of `pdf_url`.
+        """
+        ref = self.get_ref(paper['id']) or {}
+        if ref.get('pdf') and self.has_blob(ref['pdf'], "pdf"):
+            return self.pdf_path(ref['pdf'])
+
+        local_path = paper.get('local_pdf_path')
+        if not (local_path and os.path.exists(local_path)):
+            if not paper.get('pdf_url'):
+                return None
+            logger.info(f"⬇️  Re-fetching evicted PDF: {paper['id']}")
+            response = requests.get(paper['pdf_url'], timeout=timeout)
+            if response.status_code != 200:
+                logger.error(f"❌ Re-fetch failed for {paper['id']}: HTTP {response.status_code}")
+                return None
+            with tempfile.NamedTemporaryFile('wb', dir=self.root, suffix=".pdf", delete=False) as f:
+                f.write(response.content)
+            local_path = f.name
+
+        digest = self.put_pdf(local_path, move=True)
+        self.set_ref(paper['id'], pdf=digest, pdf_evicted=False)
+        return self.pdf_path(digest)
+
+    def evict_pdf(self, paper_id: str):
+        """Delete the raw PDF once parsed, unless another paper still needs it unparsed."""
+        ref = self.get_ref(paper_id)
+        if not ref or not ref.get('pdf'):
+            return
+        digest = ref['pdf']
+        still_needed = any(other.get('pdf') == digest and not other.get('text')
+                           for pid, other in self.refs.items() if pid != paper_id)
+        if not still_needed and self.has_blob(digest, "pdf"):
+            os.remove(self.pdf_path(digest))
+        self.set_ref(paper_id, pdf_evicted=True)
+
+
+def load_chunks(parsed_paper: Dict[str, Any], store: Optional[DocumentStore]) -> List[str]:
+    """Chunks of a parsed paper, inline (legacy layout) or from the document store."""
+    if 'chunks' in parsed_paper:
+        return parsed_paper['chunks']
+    if store is None:
+        raise ValueError(f"Paper {parsed_paper['id']} has no inline chunks and the document store is disabled")
+    return store.get_chunks(parsed_paper['id'])
@@ -0,0 +1,199 @@
+import os
+import json
+import copy
+import time
+import argparse
+import numpy as np
+import yaml
+from loguru import logger
+import metrics
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+
+class EmbeddingEngine:
+    """
+    CPU-oriented batch encoder used by the Vector Agent for index builds.
+
+    - Large streamed batches: `SentenceTransformer.encode` sorts each call's
+      input by length, so bigger calls mean less padding per mini-batch.
+    - Optional multi-process encode pool (one worker per core).
+    - Optional int8 dynamic quantization with a parity check against fp32.
+    - Embeddings are streamed out in fixed-size batches, in input order.
+    """
+    BACKENDS = ("torch", "int8")
+
+    def __init__(self, model, batch_size: int = 32, stream_batch_size: int = 2048,
+                 processes: int = 1, backend: str = "torch", parity_threshold: float = 0.99):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend} (expected one of {self.BACKENDS})")
+
+        self.model = model
+        self.batch_size = batch_size
+        self.stream_batch_size = stream_batch_size
+        self.processes = processes if processes > 0 else (os.cpu_count() or 1)
+        self.backend = backend
+        self.parity_threshold = parity_threshold
+        self._pool = None
+
+        if backend == "int8":
+            self.model = self._quantize(model)
+
+    @classmethod
+    def from_config(cls, vector_config: Dict[str, Any], model) -> "EmbeddingEngine":
+        engine_config = vector_config.get('engine', {})
+        return cls(
+            model,
+            batch_size=vector_config.get('batch_size', 32),
+            stream_batch_size=engine_config.get('stream_batch_size', 2048),
+            processes=engine_config.get('processes', 1),
+            backend=engine_config.get('backend', "torch"),
+            parity_threshold=engine_config.get('parity_threshold', 0.99),
+        )
+
+    # --- Backends ---
+
+    def _quantize(self, model):
+        """Quantize Linear layers to int8; keep fp32 if the output drifts too far."""
+        import torch
+
+        logger.info("⚙️  Quantizing embedding model to int8 (dynamic)...")
+        quantized = torch.quantization.quantize_dynamic(
+            copy.deepcopy(model), {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+        similarity = self.parity_check(model, quantized)
+        if similarity < self.parity_threshold:
+            logger.warning(
+                f"⚠️ int8 parity check failed (min cosine {similarity:.4f} < {self.parity_threshold}), "
+                "falling back to fp32."
+            )
+            self.backend = "torch"
+            return model
+
+        logger.info(f"✅ int8 parity check passed (min cosine {similarity:.4f}).")
+        return quantized
+
+    @staticmethod
+    def parity_check(reference, candidate, samples: Optional[List[str]] = None) -> float:
+        """Return the minimum cosine similarity between two models' embeddings."""
+        samples = samples or [
+            "Large language model agents coordinate through a shared memory.",
+            "We evaluate retrieval-augmented generation on open-domain question answering.",
+            "Table 3 reports accuracy, latency and cost for each baseline.",
+            "In this section we describe the multi-agent planning architecture in detail, "
+            "including the message passing protocol and the reward shaping used for training.",
+        ]
+        a = reference.encode(samples, normalize_embeddings=True)
+        b = candidate.encode(samples, normalize_embeddings=True)
+        return float(np.min(np.sum(a * b, axis=1)))
+
+    # --- Pool management ---
+
+    def start(self):
+        if self.processes > 1 and self._pool is None:
+            logger.info(f"🧵 Starting embedding pool with {self.processes} processes...")
+            self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+
+    def close(self):
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # --- Encoding ---
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode one batch of texts, returning float32 embeddings in input order."""
+        # encode() sorts by length internally and returns results in input order
+        with metrics.span("embedding", stage="index"):
+            if self._pool is not None:
+                embeddings = self.model.encode_multi_process(texts, self._pool, batch_size=self.batch_size)
+            else:
+                embeddings = self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+        metrics.inc("embedded_chunks_total", len(texts))
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def encode_stream(self, texts: Iterable[str]) -> Iterator[np.ndarray]:
+        """Yield embeddings in fixed-size batches of `stream_batch_size` texts."""
+        buffer = []
+        for text in texts:
+            buffer.append(text)
+            if len(buffer) >= self.stream_batch_size:
+                yield self.encode(buffer)
+                buffer = []
+        if buffer:
+            yield self.encode(buffer)
+
+
+# --- Benchmark ---
+
+def _load_benchmark_chunks(config: Dict[str, Any], limit: int) -> List[str]:
+    from doc_store import DocumentStore, load_chunks
+
+    parsed_path = os.path.join(config['data']['output_dir'], config['parser']['output_file'])
+    if os.path.exists(parsed_path):
+        with open(parsed_path, 'r', encoding='utf-8') as f:
+            papers = json.load(f)
+        # Same loader as the vector agent: inline chunks, or the document store's text
+        store = DocumentStore.from_config(config) if config.get('store', {}).get('enabled', False) else None
+        chunks, failed, error = [], 0, None
+        for paper in papers:
+            try:
+                chunks.extend(load_chunks(paper, store))
+            except (ValueError, KeyError, OSError) as e:
+                failed, error = failed + 1, e
+            if len(chunks) >= limit:
+                break
+        if failed:
+            logger.warning(f"⚠️ Could not load chunks of {failed} papers (last error: {error})")
+        if chunks:
+            return chunks[:limit]
+        logger.warning(f"⚠️ No chunks could be loaded from {parsed_path}, benchmarking on synthetic chunks.")
+    else:
+        logger.warning(f"⚠️ {parsed_path} not found, benchmarking on synthetic chunks.")
+
+    rng = np.random.default_rng(0)
+    words = "agent model retrieval graph policy reward language memory tool planning".split()
+    return [" ".join(rng.choice(words, size=int(rng.integers(20, 200)))) for _ in range(limit)]
+
+
+def benchmark(model, texts: List[str], configurations: List[Dict[str, Any]], batch_size: int = 32):
+    """Print chunks/sec for each engine configuration."""
+    print(f"\n=== Embedding benchmark: {len(texts)} chunks ===")
+    print(f"{'backend':<8} {'procs':>5} {'seconds':>9} {'chunks/s':>10}")
+    for conf in configurations:
+        with EmbeddingEngine(model, batch_size=batch_size, **conf) as engine:
+            start = time.perf_counter()
+            total = sum(len(batch) for batch in engine.encode_stream(texts))
+            elapsed = time.perf_counter() - start
+        print(f"{conf.get('backend', 'torch'):<8} {conf.get('processes', 1):>5} "
+              f"{elapsed:>9.2f} {total / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    from sentence_transformers import SentenceTransformer
+
+    parser = argparse.ArgumentParser(description="Benchmark embedding engine configurations")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--limit", type=int, default=2000, help="Number of chunks to encode")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    model = SentenceTransformer(config['vector']['model_name'], device="cpu")
+    texts = _load_benchmark_chunks(config, args.limit)
+
+    benchmark(model, texts, [
+        {"backend": "torch", "processes": 1},
+        {"backend": "torch", "processes": args.processes},
+        {"backend": "int8", "processes": 1},
+        {"backend": "int8", "processes": args.processes},
+    ], batch_size=config['vector']['batch_size'])
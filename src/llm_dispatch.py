@@ -0,0 +1,177 @@
+"""
+Shared dispatch layer for every Ollama call made by the agents.
+
+- Singleflight: identical in-flight requests (same model, messages, format)
+  share one Ollama call.
+- Per-model concurrency limit with a priority queue:
+  chat > summary > review > batch.
+- Bounded queue: when full, `QueueFullError` carries a Retry-After estimate
+  (the API turns it into HTTP 429).
+"""
+import json
+import math
+import heapq
+import hashlib
+import threading
+import time
+import ollama
+from loguru import logger
+from typing import Dict, Any, List, Optional
+
+import metrics
+
+PRIORITIES = {"chat": 0, "summary": 1, "review": 2, "batch": 3}
+
+
+class QueueFullError(Exception):
+    """The model's queue is full; retry after `retry_after` seconds."""
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(f"LLM queue for '{model}' is full, retry after {retry_after}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class _ModelGate:
+    """Priority-ordered admission to a fixed number of concurrent calls for one model."""
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting: List[tuple] = []  # heap of (priority, seq)
+        self.cond = threading.Condition()
+        self.avg_service_s = 5.0  # EWMA, only used for Retry-After estimates
+
+    def acquire(self, model: str, priority: int, seq: int):
+        with self.cond:
+            if self.active >= self.limit and len(self.waiting) >= self.max_queue:
+                retry_after = math.ceil(self.avg_service_s * (len(self.waiting) + 1) / self.limit)
+                raise QueueFullError(model, max(1, retry_after))
+            ticket = (priority, seq)
+            heapq.heappush(self.waiting, ticket)
+            while self.active >= self.limit or self.waiting[0] != ticket:
+                self.cond.wait()
+            heapq.heappop(self.waiting)
+            self.active += 1
+            # The next ticket may fit in a remaining slot; it was woken before we left the head
+            self.cond.notify_all()
+
+    def release(self, service_s: float):
+        with self.cond:
+            self.active -= 1
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * service_s
+            self.cond.notify_all()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict] = None
+        self.error: Optional[BaseException] = None
+
+
+class LLMDispatcher:
+    def __init__(self, max_concurrency: int = 1, model_concurrency: Optional[Dict[str, int]] = None,
+                 max_queue: int = 16, coalesce: bool = True):
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency or {}
+        self.max_queue = max_queue
+        self.coalesce = coalesce
+        self._gates: Dict[str, _ModelGate] = {}
+        self._inflight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "LLMDispatcher":
+        llm_config = config.get('llm', {})
+        return cls(
+            max_concurrency=llm_config.get('max_concurrency', 1),
+            model_concurrency=llm_config.get('model_concurrency', {}),
+            max_queue=llm_config.get('max_queue', 16),
+            coalesce=llm_config.get('coalesce', True),
+        )
+
+    def _gate(self, model: str) -> _ModelGate:
+        with self._lock:
+            gate = self._gates.get(model)
+            if gate is None:
+                limit = self.model_concurrency.get(model, self.max_concurrency)
+                gate = self._gates[model] = _ModelGate(limit, self.max_queue)
+            return gate
+
+    @staticmethod
+    def _request_key(model: str, messages: List[Dict], options: Dict[str, Any]) -> str:
+        payload = json.dumps([model, messages, options], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def chat(self, model: str, messages: List[Dict], priority: str = "chat",
+             agent: Optional[str] = None, **options) -> Dict:
+        """`ollama.chat` with coalescing, priority queueing and a concurrency cap."""
+        if not self.coalesce:
+            return self._call(model, messages, priority, agent, options)
+
+        key = self._request_key(model, messages, options)
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+
+        if not leader:
+            metrics.inc("llm_coalesced_total", priority=priority)
+            logger.info(f"🔗 Joining identical in-flight {priority} request for {model}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._call(model, messages, priority, agent, options)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def _call(self, model: str, messages: List[Dict], priority: str,
+              agent: Optional[str], options: Dict[str, Any]) -> Dict:
+        gate = self._gate(model)
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+
+        queued_at = time.perf_counter()
+        try:
+            gate.acquire(model, PRIORITIES.get(priority, PRIORITIES["batch"]), seq)
+        except QueueFullError:
+            metrics.inc("llm_rejected_total", model=model, priority=priority)
+            raise
+        started = time.perf_counter()
+        metrics.observe("llm_queue_seconds", started - queued_at, priority=priority)
+        metrics.set_gauge("llm_queue_depth", len(gate.waiting), model=model)
+
+        try:
+            response = ollama.chat(model=model, messages=messages, **options)
+        finally:
+            gate.release(time.perf_counter() - started)
+            metrics.set_gauge("llm_queue_depth", len(gate.waiting), model=model)
+
+        metrics.record_llm_response(response, agent=agent or priority, model=model,
+                                    prompt_chars=sum(len(m['content']) for m in messages))
+        return response
+
+
+_dispatcher: Optional[LLMDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher(config: Dict[str, Any]) -> LLMDispatcher:
+    """Process-wide dispatcher shared by all agents (built from the first caller's config)."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = LLMDispatcher.from_config(config)
+        return _dispatcher
@@ -0,0 +1,207 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+No external dependencies. Everything is a no-op until `configure(True)` is
+called, so instrumented code pays one boolean check when metrics are off.
+
+    with metrics.span("faiss_search"):
+        index.search(...)
+    metrics.inc("cache_requests_total", cache="embedding_model", result="hit")
+    metrics.observe("llm_prompt_chars", len(prompt), agent="chat")
+"""
+import time
+import threading
+from functools import wraps
+from typing import Dict, Tuple, Optional, Sequence
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Buckets for metrics that are not durations, keyed by name
+_BUCKETS = {
+    "llm_prompt_chars": SIZE_BUCKETS,
+    "llm_prompt_tokens": SIZE_BUCKETS,
+    "llm_eval_tokens_per_second": RATE_BUCKETS,
+    "retrieval_batch_size": (1, 2, 4, 8, 16, 32, 64, 128, 256),
+}
+
+_enabled = False
+_lock = threading.Lock()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.series: Dict[LabelKey, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels: LabelKey, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series.setdefault(labels, [0] * (len(self.buckets) + 2))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+
+_counters: Dict[str, Dict[LabelKey, float]] = {}
+_gauges: Dict[str, Dict[LabelKey, float]] = {}
+_histograms: Dict[str, Histogram] = {}
+
+
+def configure(enabled: bool):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, amount: float = 1.0, **labels):
+    if not _enabled:
+        return
+    key = _key(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0.0) + amount
+
+
+def set_gauge(name: str, value: float, **labels):
+    if not _enabled:
+        return
+    with _lock:
+        _gauges.setdefault(name, {})[_key(labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram(_BUCKETS.get(name, TIME_BUCKETS))
+        histogram.observe(_key(labels), value)
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(f"{self.name}_seconds", time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **labels):
+    """Time a block into the `<name>_seconds` histogram."""
+    return _Span(name, labels) if _enabled else _NOOP
+
+
+def timed(name: str, **labels):
+    """Decorator form of `span`."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_llm_response(response: Dict, agent: str, model: str, prompt_chars: Optional[int] = None):
+    """Record Ollama's own timing fields (durations are in nanoseconds)."""
+    if not _enabled:
+        return
+    if prompt_chars is not None:
+        observe("llm_prompt_chars", prompt_chars, agent=agent)
+    if response.get("prompt_eval_count"):
+        observe("llm_prompt_tokens", response["prompt_eval_count"], agent=agent)
+    if response.get("prompt_eval_duration"):
+        observe("llm_prompt_eval_seconds", response["prompt_eval_duration"] / 1e9, agent=agent, model=model)
+    if response.get("eval_duration"):
+        eval_seconds = response["eval_duration"] / 1e9
+        observe("llm_eval_seconds", eval_seconds, agent=agent, model=model)
+        if response.get("eval_count"):
+            observe("llm_eval_tokens_per_second", response["eval_count"] / eval_seconds, agent=agent, model=model)
+    if response.get("load_duration"):
+        observe("llm_load_seconds", response["load_duration"] / 1e9, agent=agent, model=model)
+
+
+def _format_labels(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                    for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for name, series in sorted(_counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name, series in sorted(_gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name, histogram in sorted(_histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, counts in histogram.series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, counts):
+                    cumulative += count
+                    le = ("le", _format_value(bound))
+                    lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {counts[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(counts[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {counts[-1]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,248 @@
+"""
+Related-papers graph built from paper-level embeddings.
+
+During indexing every paper gets a centroid (mean of its normalized chunk
+embeddings). Papers are linked to their k most similar papers by cosine
+similarity, and Louvain communities over that graph give simple topic
+clusters. Both are persisted next to the index:
+
+    paper_centroids.npy     float32 [papers x dim], row order = graph["ids"]
+    paper_graph.json        ids, titles, neighbours and clusters
+
+Updates are incremental: only new or changed papers, and papers whose
+neighbour list referenced one of them, get a full similarity row; every
+other paper just merges the changed papers into its stored list.
+"""
+import os
+import json
+import threading
+import numpy as np
+from loguru import logger
+from typing import Dict, Any, List, Optional, Tuple, Set
+from snapshot import SnapshotManager
+
+CENTROIDS_FILE = "paper_centroids.npy"
+GRAPH_FILE = "paper_graph.json"
+_UNCHANGED_COSINE = 0.9999  # Re-embedded papers this close to their old centroid keep their neighbours
+_BLOCK = 2048               # Rows per similarity block (bounds memory to BLOCK x papers floats)
+
+
+class CentroidAccumulator:
+    """Running per-paper sums of normalized chunk embeddings."""
+    def __init__(self):
+        self.sums: Dict[str, np.ndarray] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, paper_ids: List[List[str]], embeddings: np.ndarray):
+        """`paper_ids[i]` lists every paper that chunk i belongs to (a kept chunk plus its aliases)."""
+        norms = np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        for owners, vector in zip(paper_ids, embeddings / norms):
+            for paper_id in owners:
+                if paper_id in self.sums:
+                    self.sums[paper_id] += vector
+                    self.counts[paper_id] += 1
+                else:
+                    self.sums[paper_id] = vector.astype(np.float32).copy()
+                    self.counts[paper_id] = 1
+
+    def centroids(self) -> Dict[str, np.ndarray]:
+        result = {}
+        for paper_id, total in self.sums.items():
+            mean = total / self.counts[paper_id]
+            result[paper_id] = (mean / max(np.linalg.norm(mean), 1e-12)).astype(np.float32)
+        return result
+
+
+class PaperGraph:
+    def __init__(self, k: int = 10, resolution: float = 1.0):
+        self.k = k
+        self.resolution = resolution
+        self.ids: List[str] = []
+        self.titles: Dict[str, str] = {}
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.neighbors: Dict[str, List[Tuple[str, float]]] = {}
+        self.cluster_of: Dict[str, int] = {}
+        self.clusters: List[List[str]] = []
+
+    @classmethod
+    def load(cls, directory: str, k: int = 10, resolution: float = 1.0) -> "PaperGraph":
+        graph = cls(k, resolution)
+        graph_path = os.path.join(directory, GRAPH_FILE)
+        if not os.path.exists(graph_path):
+            return graph
+        centroids_path = os.path.join(directory, CENTROIDS_FILE)
+        with open(graph_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+        if centroids is None or centroids.ndim != 2 or len(centroids) != len(data['ids']):
+            # Interrupted save or hand-copied files: rows no longer line up with ids, so start over
+            logger.warning(f"⚠️ {CENTROIDS_FILE} is missing or does not match {GRAPH_FILE}; rebuilding the graph.")
+            return graph
+        graph.ids = data['ids']
+        graph.titles = data['titles']
+        graph.neighbors = {pid: [tuple(n) for n in ns] for pid, ns in data['neighbors'].items()}
+        graph.clusters = data['clusters']
+        graph.cluster_of = {pid: cid for cid, members in enumerate(graph.clusters) for pid in members}
+        graph.centroids = centroids
+        return graph
+
+    def save(self, directory: str):
+        np.save(os.path.join(directory, CENTROIDS_FILE), self.centroids)
+        with open(os.path.join(directory, GRAPH_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                "k": self.k,
+                "ids": self.ids,
+                "titles": self.titles,
+                "neighbors": self.neighbors,
+                "clusters": self.clusters,
+            }, f, ensure_ascii=False)
+
+    # --- Building ---
+
+    def _top_k(self, matrix: np.ndarray, rows: List[int]) -> Dict[int, List[Tuple[int, float]]]:
+        """Full top-k (excluding self) for the given row indices, computed in blocks."""
+        result = {}
+        k = min(self.k, len(matrix) - 1)
+        if k <= 0:
+            return {row: [] for row in rows}
+        for start in range(0, len(rows), _BLOCK):
+            block = rows[start:start + _BLOCK]
+            sims = matrix[block] @ matrix.T
+            sims[np.arange(len(block)), block] = -np.inf
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            for i, row in enumerate(block):
+                order = top[i][np.argsort(-sims[i, top[i]])]
+                result[row] = [(int(j), float(sims[i, j])) for j in order]
+        return result
+
+    def update(self, fresh: Dict[str, np.ndarray], titles: Dict[str, str]) -> Dict[str, int]:
+        """
+        `fresh`: centroids of papers embedded in this run. `titles`: every paper
+        in the corpus. Papers not in `titles` are dropped; papers in `titles`
+        but not in `fresh` keep their stored centroid.
+        """
+        dim = next((vector.shape[-1] for vector in fresh.values()), None)
+        if self.ids and dim is not None and self.centroids.shape[1] != dim:
+            # Embedding model changed: stored centroids cannot be compared with the new ones
+            logger.warning(f"⚠️ Centroid dimension changed ({self.centroids.shape[1]} -> {dim}); rebuilding the graph.")
+            self.ids, self.centroids, self.neighbors = [], np.zeros((0, 0), dtype=np.float32), {}
+        old_index = {pid: i for i, pid in enumerate(self.ids)}
+        removed = {pid for pid in self.ids if pid not in titles}
+        changed: Set[str] = set()
+        vectors: Dict[str, np.ndarray] = {}
+        for pid in titles:
+            if pid in fresh:
+                vector = fresh[pid]
+                old = old_index.get(pid)
+                if old is None or float(self.centroids[old] @ vector) < _UNCHANGED_COSINE:
+                    changed.add(pid)
+                vectors[pid] = vector
+            elif pid in old_index:
+                vectors[pid] = self.centroids[old_index[pid]]
+
+        ids = list(vectors)
+        index = {pid: i for i, pid in enumerate(ids)}
+        matrix = np.stack([vectors[pid] for pid in ids]).astype(np.float32) if ids else np.zeros((0, 0), np.float32)
+        gone = removed | changed
+
+        # Papers needing a full row: new/changed ones, and ones whose list referenced a changed
+        # or removed paper (its replacement may lie beyond the k entries that were kept)
+        recompute = set(changed)
+        for pid in ids:
+            if pid not in changed and any(n in gone or n not in index for n, _ in self.neighbors.get(pid, [])):
+                recompute.add(pid)
+        if len(recompute) > len(ids) // 2:
+            recompute = set(ids)  # Cheaper to rebuild than to patch
+
+        neighbors: Dict[str, List[Tuple[str, float]]] = {}
+        for row, top in self._top_k(matrix, [index[pid] for pid in recompute]).items():
+            neighbors[ids[row]] = [(ids[j], round(score, 4)) for j, score in top]
+
+        # Everyone else: the stored list is still exact for unchanged papers; merge in the changed ones
+        changed_rows = [index[pid] for pid in changed]
+        others = [pid for pid in ids if pid not in recompute]
+        for start in range(0, len(others), _BLOCK):
+            block = others[start:start + _BLOCK]
+            sims = matrix[[index[pid] for pid in block]] @ matrix[changed_rows].T if changed_rows else None
+            for i, pid in enumerate(block):
+                candidates = list(self.neighbors.get(pid, []))
+                if sims is not None:
+                    candidates += [(ids[row], round(float(sims[i, j]), 4))
+                                   for j, row in enumerate(changed_rows) if ids[row] != pid]
+                neighbors[pid] = sorted(candidates, key=lambda item: -item[1])[:self.k]
+
+        self.ids, self.centroids, self.neighbors = ids, matrix, neighbors
+        self.titles = {pid: titles[pid] for pid in ids}
+        self._cluster()
+        return {"papers": len(ids), "recomputed": len(recompute), "changed": len(changed), "removed": len(removed)}
+
+    def _cluster(self):
+        import networkx as nx  # Only needed at index time
+
+        graph = nx.Graph()
+        graph.add_nodes_from(self.ids)
+        for pid, ns in self.neighbors.items():
+            for other, score in ns:
+                if score > 0:
+                    graph.add_edge(pid, other, weight=score)
+        communities = nx.community.louvain_communities(graph, weight="weight", resolution=self.resolution, seed=42)
+        degree = dict(graph.degree(weight="weight"))
+        # Largest clusters first; members by weighted degree (most central first)
+        self.clusters = [sorted(c, key=lambda pid: -degree.get(pid, 0))
+                         for c in sorted(communities, key=lambda c: (-len(c), min(c)))]
+        self.cluster_of = {pid: cid for cid, members in enumerate(self.clusters) for pid in members}
+
+    # --- Lookups ---
+
+    def related(self, paper_id: str, limit: int = 10, cluster_members: int = 10) -> Optional[Dict[str, Any]]:
+        if paper_id not in self.titles:
+            return None
+        cluster_id = self.cluster_of.get(paper_id)
+        members = self.clusters[cluster_id] if cluster_id is not None else []
+        return {
+            "paper_id": paper_id,
+            "neighbors": [{"id": pid, "title": self.titles.get(pid), "score": score}
+                          for pid, score in self.neighbors.get(paper_id, [])[:limit]],
+            "cluster": {
+                "id": cluster_id,
+                "size": len(members),
+                "members": [{"id": pid, "title": self.titles.get(pid)}
+                            for pid in members if pid != paper_id][:cluster_members],
+            },
+        }
+
+
+class PaperGraphStore:
+    """Read side for the API: follows the live snapshot generation (or in-place files)."""
+    def __init__(self, config: Dict[str, Any]):
+        self.data_dir = config['data']['output_dir']
+        self.snapshots = SnapshotManager.from_config(config) \
+            if config.get('snapshots', {}).get('enabled', False) else None
+        self._key = None
+        self._graph: Optional[PaperGraph] = None
+        self._lock = threading.Lock()
+
+    def _active_dir(self) -> Tuple[Any, str]:
+        generation = self.snapshots.current() if self.snapshots is not None else None
+        if generation is not None:
+            return generation, self.snapshots.path(generation)
+        try:
+            return os.path.getmtime(os.path.join(self.data_dir, GRAPH_FILE)), self.data_dir
+        except OSError:
+            return None, self.data_dir
+
+    def graph(self) -> Optional[PaperGraph]:
+        key, directory = self._active_dir()
+        if key is None:
+            return None
+        if key != self._key:
+            with self._lock:
+                if key != self._key:
+                    self._graph = PaperGraph.load(directory)
+                    self._key = key
+                    logger.info(f"🕸️  Loaded related-papers graph ({len(self._graph.ids)} papers)")
+        return self._graph
+
+    def related(self, paper_id: str, limit: int = 10) -> Optional[Dict[str, Any]]:
+        graph = self.graph()
+        return graph.related(paper_id, limit) if graph is not None else None
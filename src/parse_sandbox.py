@@ -0,0 +1,234 @@
+"""
+Isolated PDF text extraction with per-document limits.
+
+Pathological PDFs (huge scans, broken xref tables, thousands of vector
+pages) can make PyMuPDF run for minutes or exhaust memory. Extraction runs
+in a worker process that is reused across documents and killed when a
+document exceeds its wall-time or memory limit:
+
+    with ParseSandbox.from_config(config['parser']['isolation']) as sandbox:
+        result = sandbox.extract(pdf_path)               # full extraction
+        result = sandbox.extract(pdf_path, cheap=True)   # first N pages, plain text flags
+
+Documents that fail go into a `ParseQuarantine` (JSON file, with the reason)
+so later runs go straight to the cheap mode instead of stalling again.
+"""
+import os
+import json
+import time
+import multiprocessing
+from loguru import logger
+from typing import Dict, Any, Optional
+
+try:
+    import resource  # Unix only; elsewhere the parent-side RSS check is the only memory limit
+except ImportError:
+    resource = None
+
+_POLL_S = 0.05
+_START_TIMEOUT_S = 60
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class PageLimitExceeded(Exception):
+    pass
+
+
+def _statm(pid: str = "self") -> Optional[tuple]:
+    """(virtual bytes, resident bytes) from /proc, or None where it is unavailable"""
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            size, resident = f.read().split()[:2]
+        return int(size) * _PAGE_SIZE, int(resident) * _PAGE_SIZE
+    except (OSError, ValueError):
+        return None
+
+
+def _extract(pdf_path: str, cheap: bool, max_pages: int, cheap_pages: int) -> tuple:
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as doc:
+        pages = doc.page_count
+        if cheap:
+            # Text-only flags: no ligature/whitespace preservation, first pages only
+            return "".join(doc[i].get_text(flags=fitz.TEXT_MEDIABOX_CLIP)
+                           for i in range(min(pages, cheap_pages))), pages
+        if max_pages and pages > max_pages:
+            raise PageLimitExceeded(f"{pages} pages (limit {max_pages})")
+        return "".join(page.get_text() for page in doc), pages
+
+
+def _worker(conn, max_rss_bytes: int):
+    """Worker process: extract documents sent over `conn` until it receives None."""
+    import fitz  # noqa: F401  (imported before the limit so the baseline includes it)
+
+    if resource is not None and max_rss_bytes:
+        baseline = _statm()
+        if baseline is not None:
+            # Address space limit: the worker's footprint so far plus the per-document budget
+            limit = baseline[0] + max_rss_bytes
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    conn.send("ready")
+
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        try:
+            text, pages = _extract(*job)
+            conn.send(("ok", text, pages, None))
+        except PageLimitExceeded as e:
+            conn.send(("too_many_pages", "", None, str(e)))
+        except MemoryError as e:
+            conn.send(("memory", "", None, str(e) or "MemoryError"))
+        except Exception as e:
+            reason = "memory" if "malloc" in str(e).lower() or "memory" in str(e).lower() else "error"
+            conn.send((reason, "", None, f"{type(e).__name__}: {e}"))
+
+
+class ParseResult:
+    def __init__(self, status: str, text: str = "", pages: Optional[int] = None,
+                 detail: Optional[str] = None, seconds: float = 0.0, cheap: bool = False):
+        self.status = status  # "ok", "timeout", "memory", "too_many_pages", "crashed" or "error"
+        self.text = text
+        self.pages = pages
+        self.detail = detail
+        self.seconds = seconds
+        self.cheap = cheap
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+class ParseSandbox:
+    def __init__(self, timeout_s: float = 60, max_pages: int = 300, max_rss_mb: int = 1024, cheap_pages: int = 30):
+        self.timeout_s = timeout_s
+        self.max_pages = max_pages
+        self.max_rss_bytes = max_rss_mb * 2**20 if max_rss_mb else 0
+        self.cheap_pages = cheap_pages
+        # spawn: the API process has threads (model, pools) that make fork unsafe
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+
+    @classmethod
+    def from_config(cls, isolation_config: Dict[str, Any]) -> "ParseSandbox":
+        return cls(
+            timeout_s=isolation_config.get('timeout_s', 60),
+            max_pages=isolation_config.get('max_pages', 300),
+            max_rss_mb=isolation_config.get('max_rss_mb', 1024),
+            cheap_pages=isolation_config.get('cheap_pages', 30),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start(self):
+        self._conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(target=_worker, args=(child_conn, self.max_rss_bytes),
+                                              name="pdf-parser", daemon=True)
+        self._process.start()
+        child_conn.close()
+        # Worker start-up (interpreter + PyMuPDF import) is not charged to the first document
+        try:
+            ready = self._conn.poll(_START_TIMEOUT_S) and self._conn.recv() == "ready"
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            self._kill()
+            raise RuntimeError("PDF parser worker failed to start")
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+            self._conn.close()
+        self._process = self._conn = None
+
+    def close(self):
+        if self._process is not None and self._process.is_alive():
+            try:
+                self._conn.send(None)
+                self._process.join(timeout=5)
+            except OSError:
+                pass
+        self._kill()
+
+    def extract(self, pdf_path: str, cheap: bool = False) -> ParseResult:
+        """Extract a PDF's text in the worker, enforcing the wall-time and memory limits."""
+        if self._process is None or not self._process.is_alive():
+            self._start()
+
+        started = time.perf_counter()
+        self._conn.send((pdf_path, cheap, self.max_pages, self.cheap_pages))
+        status, detail = None, None
+        while not self._conn.poll(_POLL_S):
+            elapsed = time.perf_counter() - started
+            if not self._process.is_alive():
+                status, detail = "crashed", f"worker exited with code {self._process.exitcode}"
+                break
+            if elapsed > self.timeout_s:
+                status, detail = "timeout", f"no result after {self.timeout_s}s"
+                break
+            usage = _statm(str(self._process.pid)) if self.max_rss_bytes else None
+            if usage is not None and usage[1] > self.max_rss_bytes:
+                status, detail = "memory", f"worker RSS {usage[1] / 2**20:.0f} MiB"
+                break
+
+        if status is None:
+            try:
+                status, text, pages, detail = self._conn.recv()
+            except (EOFError, OSError):
+                status, text, pages, detail = "crashed", "", None, "worker died while sending the result"
+            if status == "ok":
+                return ParseResult("ok", text, pages, seconds=time.perf_counter() - started, cheap=cheap)
+
+        # A failed document may leave the worker stuck or its heap bloated: start fresh next time
+        self._kill()
+        return ParseResult(status, detail=detail, seconds=time.perf_counter() - started, cheap=cheap)
+
+
+class ParseQuarantine:
+    """Papers whose PDF failed full extraction, keyed by paper id (reset when the PDF changes)."""
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def _signature(pdf_path: str) -> str:
+        stat = os.stat(pdf_path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def get(self, paper_id: str, pdf_path: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(paper_id)
+        if entry is not None and entry.get('pdf') != self._signature(pdf_path):
+            del self.entries[paper_id]  # New PDF: give it a normal attempt again
+            return None
+        return entry
+
+    def add(self, paper_id: str, pdf_path: str, result: ParseResult):
+        self.entries[paper_id] = {
+            "reason": result.status,
+            "detail": result.detail,
+            "pdf": self._signature(pdf_path),
+            "quarantined_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "recovered": None,
+        }
+
+    def mark_recovered(self, paper_id: str, recovered: bool):
+        self.entries[paper_id]["recovered"] = recovered
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+        if self.entries:
+            logger.info(f"🧯 {len(self.entries)} papers in parse quarantine ({self.path})")
@@ -0,0 +1,325 @@
+"""
+Opt-in profiling for API requests and pipeline runs.
+
+- API: send `X-Profile: 1` (or `?profile=1`) with any request. A sampling
+  profiler records the stacks of every thread running project code (sync
+  endpoints run in worker threads, which cProfile on the event loop would
+  miss), and tracemalloc records peak memory. Only admins can profile
+  (`X-Admin-Token` matching `profiling.admin_token`, or a localhost client
+  when no token is set), and only one request is profiled at a time; other
+  flagged requests are served unprofiled.
+- CLI: `--profile` on an agent's `__main__` wraps the run in cProfile plus
+  tracemalloc.
+
+Reports are saved under data/profiles/ as `<id>.json`, with a `.folded`
+stack file (flamegraph.pl / speedscope) or a `.prof` file (pstats /
+snakeviz). When profiling is disabled the middleware is not installed, and
+an unflagged request only pays for one header scan.
+"""
+import os
+import io
+import re
+import sys
+import json
+import time
+import hmac
+import uuid
+import marshal
+import yaml
+import pstats
+import asyncio
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import parse_qs
+from loguru import logger
+from typing import Dict, Any, List, Optional
+
+_SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+_ID_RE = re.compile(r"[^\w.-]")
+_LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+# One API profile at a time: the sampler and tracemalloc peak are process-wide
+_session_lock = threading.Lock()
+
+# tracemalloc is process-wide: shared by overlapping sessions
+_trace_lock = threading.Lock()
+_trace_users = 0
+_trace_owned = False  # Leave tracing alone if it was started elsewhere (PYTHONTRACEMALLOC)
+
+
+def _trace_start():
+    global _trace_users, _trace_owned
+    with _trace_lock:
+        if _trace_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _trace_owned = True
+        _trace_users += 1
+        tracemalloc.reset_peak()
+
+
+def _trace_stop(top: int = 10) -> Dict[str, Any]:
+    global _trace_users, _trace_owned
+    with _trace_lock:
+        current, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().statistics("lineno")[:top]
+        _trace_users -= 1
+        if _trace_users == 0 and _trace_owned:
+            tracemalloc.stop()
+            _trace_owned = False
+    return {
+        "peak_memory_bytes": peak,
+        "traced_memory_bytes": current,
+        "top_allocations": [
+            {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             "size_bytes": stat.size, "count": stat.count}
+            for stat in stats
+        ],
+    }
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads that are running project code."""
+    def __init__(self, interval_s: float = 0.005):
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack, in_project = [], False
+                while frame is not None:
+                    code = frame.f_code
+                    in_project = in_project or code.co_filename.startswith(_SRC_DIR)
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                # Idle pool/event-loop threads never touch project code
+                if in_project:
+                    stack.append(f"thread:{names.get(ident, ident)}")
+                    self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = 30) -> List[Dict[str, Any]]:
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for function in set(stack[1:]):
+                total_counts[function] += count
+        total = sum(self.stacks.values()) or 1
+        return [
+            {"function": function, "self_samples": self_counts[function], "total_samples": count,
+             "total_pct": round(100 * count / total, 1)}
+            for function, count in total_counts.most_common(limit)
+        ]
+
+
+class ProfileSession:
+    """One profile: "sampling" (all threads) or "cprofile" (calling thread), plus tracemalloc."""
+    def __init__(self, kind: str, target: str, request_id: Optional[str] = None, interval_ms: float = 5):
+        self.kind = kind
+        self.target = target
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.id = _ID_RE.sub("_", f"{time.strftime('%Y%m%d-%H%M%S')}-{self.request_id}")
+        self.interval_ms = interval_ms
+        self.report: Dict[str, Any] = {}
+        self.artifacts: Dict[str, bytes] = {}
+        self._profiler = None
+
+    def start(self):
+        _trace_start()
+        if self.kind == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = SamplingProfiler(self.interval_ms / 1000)
+            self._profiler.start()
+        self._started = time.perf_counter()
+        self._started_at = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    def stop(self, **extra) -> Dict[str, Any]:
+        wall_s = time.perf_counter() - self._started
+        if self.kind == "cprofile":
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+
+        self.report = {
+            "id": self.id,
+            "request_id": self.request_id,
+            "kind": self.kind,
+            "target": self.target,
+            "started_at": self._started_at,
+            "wall_s": round(wall_s, 4),
+            **extra,
+            **_trace_stop(),
+        }
+
+        if self.kind == "cprofile":
+            stats = pstats.Stats(self._profiler, stream=io.StringIO())
+            self.report["top_functions"] = [
+                {"function": f"{name} ({os.path.basename(file)}:{line})", "calls": nc,
+                 "self_s": round(tt, 4), "total_s": round(ct, 4)}
+                for (file, line, name), (cc, nc, tt, ct, _) in
+                sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:30]
+            ]
+            self.artifacts["prof"] = marshal.dumps(stats.stats)  # Same format as Profile.dump_stats
+        else:
+            self.report.update(samples=self._profiler.samples, interval_ms=self.interval_ms,
+                               top_functions=self._profiler.top_functions())
+            self.artifacts["folded"] = self._profiler.folded().encode("utf-8")
+        return self.report
+
+
+class ProfileStore:
+    def __init__(self, root: str, keep: int = 50):
+        self.root = root
+        self.keep = keep
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ProfileStore":
+        profiling_config = config.get('profiling', {})
+        return cls(os.path.join(config['data']['output_dir'], profiling_config.get('dir', "profiles")),
+                   keep=profiling_config.get('keep', 50))
+
+    def save(self, session: ProfileSession) -> str:
+        session.report["files"] = [f"{session.id}.{ext}" for ext in session.artifacts]
+        for ext, data in session.artifacts.items():
+            with open(os.path.join(self.root, f"{session.id}.{ext}"), 'wb') as f:
+                f.write(data)
+        path = os.path.join(self.root, f"{session.id}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(session.report, f, ensure_ascii=False, indent=2)
+        self._prune()
+        return path
+
+    def _reports(self) -> List[str]:
+        return sorted((name for name in os.listdir(self.root) if name.endswith(".json")), reverse=True)
+
+    def _prune(self):
+        for name in self._reports()[self.keep:]:
+            profile_id = name[:-len(".json")]
+            for other in os.listdir(self.root):
+                if other.startswith(profile_id + "."):
+                    os.remove(os.path.join(self.root, other))
+
+    def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        profiles = []
+        for name in self._reports()[:limit]:
+            with open(os.path.join(self.root, name), 'r', encoding='utf-8') as f:
+                report = json.load(f)
+            profiles.append({key: report.get(key) for key in
+                             ("id", "request_id", "kind", "target", "started_at", "wall_s", "status",
+                              "peak_memory_bytes", "files")})
+        return profiles
+
+    def path(self, file_name: str) -> Optional[str]:
+        """Path of a saved profile file, or None (names outside the store are rejected)."""
+        if os.path.basename(file_name) != file_name:
+            return None
+        path = os.path.join(self.root, file_name)
+        return path if os.path.isfile(path) else None
+
+
+def is_admin(scope: Dict[str, Any], admin_token: Optional[str]) -> bool:
+    """X-Admin-Token matches the configured token; without one, only localhost clients."""
+    if admin_token:
+        sent = next((value for name, value in scope["headers"] if name == b"x-admin-token"), b"")
+        return hmac.compare_digest(sent, admin_token.encode("utf-8"))
+    client = scope.get("client")
+    return client is not None and client[0] in _LOCAL_HOSTS
+
+
+def _wants_profile(scope: Dict[str, Any]) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.lower() in (b"1", b"true", b"yes")
+    query = scope.get("query_string", b"")
+    return b"profile=" in query and parse_qs(query.decode("latin-1")).get("profile", [""])[0] in ("1", "true")
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: profiles only admin requests flagged with X-Profile / ?profile=1."""
+    def __init__(self, app, store: ProfileStore, interval_ms: float = 5, admin_token: Optional[str] = None):
+        self.app = app
+        self.store = store
+        self.interval_ms = interval_ms
+        self.admin_token = admin_token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope) or not is_admin(scope, self.admin_token):
+            await self.app(scope, receive, send)
+            return
+        if not _session_lock.acquire(blocking=False):
+            logger.info(f"🩺 Profile of {scope['path']} skipped: another profile is running")
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            _session_lock.release()
+
+    async def _profile(self, scope, receive, send):
+        request_id = next((value.decode("latin-1") for name, value in scope["headers"]
+                           if name == b"x-request-id"), None)
+        session = ProfileSession("sampling", f"{scope['method']} {scope['path']}", request_id, self.interval_ms)
+        status = {}
+
+        async def send_with_ids(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-request-id", session.request_id.encode("latin-1")),
+                    (b"x-profile-id", session.id.encode("latin-1")),
+                ]}
+            await send(message)
+
+        session.start()
+        try:
+            await self.app(scope, receive, send_with_ids)
+        finally:
+            # Snapshotting and writing the report stay off the event loop
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, lambda: session.stop(status=status.get("code")))
+            path = await loop.run_in_executor(None, self.store.save, session)
+            logger.info(f"🩺 Profile of {session.target} saved to {path} ({session.report['wall_s']}s)")
+
+
+@contextmanager
+def profile_run(target: str, enabled: bool = True, config_path: str = "config.yaml"):
+    """Profile a pipeline run with cProfile + tracemalloc (agents' `--profile`)."""
+    if not enabled:
+        yield
+        return
+    with open(config_path, 'r', encoding='utf-8') as f:
+        store = ProfileStore.from_config(yaml.safe_load(f))
+    session = ProfileSession("cprofile", target)
+    session.start()
+    try:
+        yield
+    finally:
+        session.stop()
+        path = store.save(session)
+        logger.info(f"🩺 Profile of {target} saved to {path} "
+                    f"({session.report['wall_s']}s, peak {session.report['peak_memory_bytes'] / 2**20:.1f} MiB)")
@@ -0,0 +1,316 @@
+"""
+Retrieval sidecar: one process owns the SentenceTransformer and the FAISS
+index and serves encode/search to every API worker over a Unix socket.
+
+    python src/retrieval_service.py            # start the service
+    # then set vector.retrieval_service.enabled: true in config.yaml
+
+Wire format (all integers big-endian, floats little-endian float32):
+
+    frame    := opcode:u8 length:u32 payload[length]
+    string   := length:u32 utf8[length]
+
+    ENCODE   -> normalize:u8 count:u32 string*count
+             <- RESULT rows:u32 dim:u32 float32[rows*dim]
+    SEARCH   -> top_k:u16 query:string paper_id:string (empty = any paper)
+                [categories:string (comma-separated) date_from:string date_to:string]
+             <- RESULT count:u32 (score:f32 title:string text:string)*count
+    PING     <- RESULT (empty)
+    any      <- ERROR message:utf8
+
+Encode requests arriving within `batch_window_ms` of each other (from any
+worker) are micro-batched into a single `model.encode` call.
+"""
+import os
+import sys
+import socket
+import struct
+import asyncio
+import functools
+import argparse
+import threading
+import numpy as np
+import yaml
+from loguru import logger
+from typing import List, Dict, Any, Optional, Tuple
+
+import metrics
+
+OP_ENCODE = 1
+OP_SEARCH = 2
+OP_PING = 3
+OP_RESULT = 0x80
+OP_ERROR = 0xFF
+
+_HEADER = struct.Struct("!BI")
+_U32 = struct.Struct("!I")
+
+
+class RetrievalServiceError(RuntimeError):
+    """Raised by the client when the service answers with an error frame."""
+
+
+# --- Encoding helpers ---
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _U32.pack(len(data)) + data
+
+
+def _unpack_str(buf: memoryview, offset: int) -> Tuple[str, int]:
+    (length,) = _U32.unpack_from(buf, offset)
+    offset += _U32.size
+    return bytes(buf[offset:offset + length]).decode("utf-8"), offset + length
+
+
+def _pack_vectors(vectors: np.ndarray) -> bytes:
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    return struct.pack("!II", *vectors.shape) + vectors.tobytes()
+
+
+def _unpack_vectors(buf: bytes) -> np.ndarray:
+    rows, dim = struct.unpack_from("!II", buf)
+    return np.frombuffer(buf, dtype="<f4", offset=8, count=rows * dim).reshape(rows, dim).astype(np.float32)
+
+
+def _pack_results(results: List[Dict[str, Any]]) -> bytes:
+    parts = [_U32.pack(len(results))]
+    for res in results:
+        parts.append(struct.pack("<f", res['score']))
+        parts.append(_pack_str(res.get('paper_title') or ""))
+        parts.append(_pack_str(res.get('text') or ""))
+    return b"".join(parts)
+
+
+def _unpack_results(buf: bytes) -> List[Dict[str, Any]]:
+    view = memoryview(buf)
+    (count,) = _U32.unpack_from(view, 0)
+    offset = _U32.size
+    results = []
+    for _ in range(count):
+        (score,) = struct.unpack_from("<f", view, offset)
+        title, offset = _unpack_str(view, offset + 4)
+        text, offset = _unpack_str(view, offset)
+        results.append({"score": float(score), "paper_title": title, "text": text})
+    return results
+
+
+# --- Server ---
+
+class MicroBatcher:
+    """Coalesces concurrent encode requests into single `model.encode` calls."""
+    def __init__(self, model, window_ms: float = 5, max_batch_size: int = 64):
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def encode(self, texts: List[str], normalize: bool = False) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, normalize, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.window
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            texts = [t for item in pending for t in item[0]]
+            try:
+                vectors = await loop.run_in_executor(None, self._encode, texts)
+            except Exception as e:
+                for _, _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            metrics.observe("retrieval_batch_size", len(texts))
+            start = 0
+            for batch_texts, normalize, future in pending:
+                rows = vectors[start:start + len(batch_texts)]
+                start += len(batch_texts)
+                if normalize:
+                    rows = rows / np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+                future.set_result(rows)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        with metrics.span("embedding", stage="service"):
+            return np.asarray(self.model.encode(texts, batch_size=self.max_batch_size), dtype=np.float32)
+
+
+class RetrievalServer:
+    def __init__(self, vector_agent, socket_path: str, window_ms: float = 5, max_batch_size: int = 64):
+        self.agent = vector_agent
+        self.socket_path = socket_path
+        self.batcher = MicroBatcher(vector_agent.model, window_ms, max_batch_size)
+
+    async def _handle(self, op: int, payload: bytes) -> Tuple[int, bytes]:
+        if op == OP_PING:
+            return OP_RESULT, b""
+
+        if op == OP_ENCODE:
+            view = memoryview(payload)
+            normalize = bool(view[0])
+            (count,) = _U32.unpack_from(view, 1)
+            offset, texts = 1 + _U32.size, []
+            for _ in range(count):
+                text, offset = _unpack_str(view, offset)
+                texts.append(text)
+            return OP_RESULT, _pack_vectors(await self.batcher.encode(texts, normalize))
+
+        if op == OP_SEARCH:
+            view = memoryview(payload)
+            (top_k,) = struct.unpack_from("!H", view, 0)
+            query, offset = _unpack_str(view, 2)
+            paper_id, offset = _unpack_str(view, offset)
+            categories, date_from, date_to = "", "", ""
+            if offset < len(view):  # Optional filter fields
+                categories, offset = _unpack_str(view, offset)
+                date_from, offset = _unpack_str(view, offset)
+                date_to, offset = _unpack_str(view, offset)
+            query_vector = await self.batcher.encode([query])
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(
+                    self.agent.search_by_vector, query_vector, paper_id or None, top_k,
+                    categories=categories.split(",") if categories else None,
+                    date_from=date_from or None, date_to=date_to or None,
+                )
+            )
+            return OP_RESULT, _pack_results(results)
+
+        raise ValueError(f"Unknown opcode: {op}")
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                op, length = _HEADER.unpack(header)
+                payload = await reader.readexactly(length)
+                try:
+                    status, body = await self._handle(op, payload)
+                except Exception as e:
+                    logger.error(f"❌ Retrieval request failed: {e}")
+                    status, body = OP_ERROR, str(e).encode("utf-8")
+                writer.write(_HEADER.pack(status, len(body)) + body)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self._serve_client, path=self.socket_path)
+        batcher_task = asyncio.create_task(self.batcher.run())
+        logger.success(f"🛰️  Retrieval service listening on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+# --- Client ---
+
+class RetrievalClient:
+    """
+    Drop-in encode/search client used by VectorAgent when the service is enabled.
+    Keeps one connection per thread so concurrent requests in a worker overlap.
+    """
+    def __init__(self, socket_path: str, timeout: float = 30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _recv_exact(self, conn: socket.socket, size: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < size:
+            chunk = conn.recv(size - len(buf))
+            if not chunk:
+                raise ConnectionError("Retrieval service closed the connection")
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def _call(self, op: int, payload: bytes) -> bytes:
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.sendall(_HEADER.pack(op, len(payload)) + payload)
+                status, length = _HEADER.unpack(self._recv_exact(conn, _HEADER.size))
+                body = self._recv_exact(conn, length)
+                break
+            except (ConnectionError, OSError):
+                # Stale connection (e.g. service restarted): reconnect once
+                self.close()
+                if attempt:
+                    raise
+        if status == OP_ERROR:
+            raise RetrievalServiceError(body.decode("utf-8"))
+        return body
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def ping(self):
+        self._call(OP_PING, b"")
+
+    def encode(self, texts: List[str], normalize: bool = False) -> np.ndarray:
+        payload = struct.pack("!B", int(normalize)) + _U32.pack(len(texts)) + b"".join(_pack_str(t) for t in texts)
+        return _unpack_vectors(self._call(OP_ENCODE, payload))
+
+    def search(self, query: str, paper_id: Optional[str] = None, top_k: int = 3,
+               categories: Optional[List[str]] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None) -> List[Dict]:
+        payload = (struct.pack("!H", top_k) + _pack_str(query) + _pack_str(paper_id or "")
+                   + _pack_str(",".join(categories or [])) + _pack_str(date_from or "") + _pack_str(date_to or ""))
+        return _unpack_results(self._call(OP_SEARCH, payload))
+
+
+if __name__ == "__main__":
+    from agents.vector_agent import VectorAgent
+
+    parser = argparse.ArgumentParser(description="Run the shared retrieval service")
+    parser.add_argument("--config", default="config.yaml")
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        service_config = yaml.safe_load(f)['vector'].get('retrieval_service', {})
+
+    agent = VectorAgent(args.config, use_retrieval_service=False)
+    server = RetrievalServer(
+        agent,
+        service_config.get('socket_path', "./data/retrieval.sock"),
+        window_ms=service_config.get('batch_window_ms', 5),
+        max_batch_size=service_config.get('max_batch_size', 64),
+    )
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,101 @@
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List
+
+
+class _PaperEntries:
+    """Cached first-turn answers for one paper, with their query embeddings stacked."""
+    def __init__(self, dimension: int):
+        self.embeddings = np.empty((0, dimension), dtype=np.float32)
+        self.items: List[Dict[str, Any]] = []
+
+    def remove(self, positions: List[int]):
+        drop = set(positions)
+        keep = [i for i in range(len(self.items)) if i not in drop]
+        self.embeddings = self.embeddings[keep]
+        self.items = [self.items[i] for i in keep]
+
+
+class SemanticCache:
+    """
+    Per-paper semantic answer cache.
+
+    Queries are compared by cosine similarity of their (normalized) embeddings;
+    a stored answer is reused when the best match reaches `threshold`.
+    Entries expire after `ttl_seconds`; papers and per-paper entries are
+    evicted least-recently-used first.
+    """
+    def __init__(self, threshold: float = 0.92, ttl_seconds: float = 86400,
+                 max_papers: int = 512, max_entries_per_paper: int = 64):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_papers = max_papers
+        self.max_entries_per_paper = max_entries_per_paper
+        self._papers: "OrderedDict[str, _PaperEntries]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cache_config: Dict[str, Any]) -> "SemanticCache":
+        return cls(
+            threshold=cache_config.get('similarity_threshold', 0.92),
+            ttl_seconds=cache_config.get('ttl_seconds', 86400),
+            max_papers=cache_config.get('max_papers', 512),
+            max_entries_per_paper=cache_config.get('max_entries_per_paper', 64),
+        )
+
+    def _expire(self, entries: _PaperEntries, now: float):
+        expired = [i for i, item in enumerate(entries.items) if now - item['created_at'] > self.ttl_seconds]
+        if expired:
+            entries.remove(expired)
+
+    def lookup(self, paper_id: str, embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Return the cached value of the most similar query above the threshold, if any."""
+        now = time.time()
+        with self._lock:
+            entries = self._papers.get(paper_id)
+            if entries is None:
+                return None
+            self._expire(entries, now)
+            if not entries.items:
+                del self._papers[paper_id]
+                return None
+
+            similarities = entries.embeddings @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            self._papers.move_to_end(paper_id)
+            item = entries.items[best]
+            item['last_used'] = now
+            return {**item['value'], "similarity": float(similarities[best]), "cached_query": item['query']}
+
+    def store(self, paper_id: str, query: str, embedding: np.ndarray, value: Dict[str, Any]):
+        now = time.time()
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            entries = self._papers.get(paper_id)
+            if entries is None:
+                entries = self._papers[paper_id] = _PaperEntries(embedding.shape[1])
+            self._papers.move_to_end(paper_id)
+
+            self._expire(entries, now)
+            if len(entries.items) >= self.max_entries_per_paper:
+                least_recent = min(range(len(entries.items)), key=lambda i: entries.items[i]['last_used'])
+                entries.remove([least_recent])
+
+            entries.embeddings = np.vstack([entries.embeddings, embedding])
+            entries.items.append({"query": query, "value": value, "created_at": now, "last_used": now})
+
+            while len(self._papers) > self.max_papers:
+                self._papers.popitem(last=False)
+
+    def invalidate(self, paper_id: Optional[str] = None):
+        """Drop cached answers for one paper, or for all papers (e.g. after a re-index)."""
+        with self._lock:
+            if paper_id is None:
+                self._papers.clear()
+            else:
+                self._papers.pop(paper_id, None)
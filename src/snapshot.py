@@ -0,0 +1,324 @@
+"""
+Versioned corpus snapshot generations.
+
+    data/snapshots/
+        gen-000007/             faiss_index.bin + chunks_map.json (or shards.json + shards/<key>/...),
+                                metadata.json, context_packs.json, manifest.json (sha256 + size per file)
+        CURRENT                 name of the live generation, swapped atomically
+
+`create_index` builds a new generation in a staging directory and flips
+CURRENT when it is complete, so readers never see a half-written index.
+Running VectorAgents notice the new pointer and reload.
+
+    python src/snapshot.py list
+    python src/snapshot.py export corpus.tar.gz [--with-db]
+    python src/snapshot.py import corpus.tar.gz
+    python src/snapshot.py gc
+"""
+import os
+import io
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import tarfile
+import argparse
+import tempfile
+import yaml
+from loguru import logger
+from typing import Dict, Any, List, Optional, Tuple
+
+MANIFEST = "manifest.json"
+_PREFIX = "gen-"
+_STALE_STAGING_S = 6 * 3600
+
+
+def _sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _extract_archive(tar: tarfile.TarFile, path: str):
+    """
+    extractall() with the "data" filter where tarfile has it (3.10.12+ / 3.11.4+);
+    on older interpreters, reject absolute paths, `..`, links and special files ourselves.
+    """
+    if hasattr(tarfile, "data_filter"):
+        tar.extractall(path, filter="data")
+        return
+    root = os.path.realpath(path)
+    for member in tar.getmembers():
+        target = os.path.realpath(os.path.join(root, member.name))
+        if os.path.isabs(member.name) or ".." in member.name.replace("\\", "/").split("/") \
+                or not (member.isfile() or member.isdir()) or os.path.commonpath([root, target]) != root:
+            raise RuntimeError(f"Refusing unsafe archive member: {member.name}")
+    tar.extractall(path)
+
+
+class SnapshotManager:
+    def __init__(self, root: str, keep: int = 3):
+        self.root = root
+        self.keep = keep
+        self.pointer_path = os.path.join(root, "CURRENT")
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "SnapshotManager":
+        snap_config = config.get('snapshots', {})
+        return cls(os.path.join(config['data']['output_dir'], snap_config.get('dir', "snapshots")),
+                   keep=snap_config.get('keep', 3))
+
+    # --- Generations ---
+
+    def generations(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.root)
+                      if name.startswith(_PREFIX) and not name.endswith(".tmp")
+                      and os.path.exists(os.path.join(self.root, name, MANIFEST)))
+
+    def current(self) -> Optional[str]:
+        try:
+            with open(self.pointer_path, 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def path(self, generation: str, file_name: str = "") -> str:
+        return os.path.join(self.root, generation, file_name)
+
+    def manifest(self, generation: str) -> Dict[str, Any]:
+        with open(self.path(generation, MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def begin(self) -> Tuple[str, str]:
+        """Reserve the next generation; returns (name, staging dir)."""
+        existing = [int(name[len(_PREFIX):len(_PREFIX) + 6]) for name in os.listdir(self.root)
+                    if name.startswith(_PREFIX)]
+        generation = f"{_PREFIX}{max(existing, default=0) + 1:06d}"
+        staging = os.path.join(self.root, f"{generation}.tmp")
+        os.makedirs(staging)
+        return generation, staging
+
+    def _previous_entries(self) -> Tuple[Optional[str], Dict[str, Any]]:
+        """The current generation and its manifest entries (for reusing checksums of linked files)."""
+        previous = self.current()
+        try:
+            return previous, self.manifest(previous)['files'] if previous else {}
+        except (OSError, ValueError, KeyError):
+            return None, {}
+
+    def commit(self, generation: str, staging: str, info: Optional[Dict[str, Any]] = None) -> str:
+        """Checksum the staged files, publish the generation and make it current."""
+        previous, previous_files = self._previous_entries()
+        files, reused = {}, 0
+        for dir_path, _, names in os.walk(staging):
+            for name in names:
+                file_path = os.path.join(dir_path, name)
+                rel_path = os.path.relpath(file_path, staging).replace(os.sep, "/")
+                stat = os.stat(file_path)
+                entry = previous_files.get(rel_path)
+                if entry is not None:
+                    # Hard-linked (same inode) or copied with its mtime (unchanged shards): same content
+                    try:
+                        old = os.stat(self.path(previous, rel_path))
+                        same = (old.st_dev, old.st_ino) == (stat.st_dev, stat.st_ino) or \
+                            (old.st_size, old.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        same = False
+                    if same and entry['bytes'] == stat.st_size:
+                        files[rel_path] = entry
+                        reused += 1
+                        continue
+                files[rel_path] = {"sha256": _sha256(file_path), "bytes": stat.st_size}
+        files = dict(sorted(files.items()))
+        if reused:
+            logger.debug(f"♻️  Reused {reused}/{len(files)} checksums from {previous}")
+
+        manifest = {
+            "generation": generation,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "files": files,
+            **(info or {}),
+        }
+        with open(os.path.join(staging, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(staging, self.path(generation))
+        self.activate(generation)
+        self.gc()
+        return generation
+
+    def abort(self, staging: str):
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def activate(self, generation: str):
+        """Atomically point CURRENT at `generation`."""
+        temp_path = f"{self.pointer_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(generation)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.pointer_path)
+        logger.success(f"🔀 Snapshot {generation} is now current.")
+
+    def verify(self, generation: str) -> List[str]:
+        """Return the files whose checksum or size does not match the manifest."""
+        bad = []
+        for name, entry in self.manifest(generation)['files'].items():
+            file_path = self.path(generation, name)
+            if not os.path.exists(file_path) or os.path.getsize(file_path) != entry['bytes'] \
+                    or _sha256(file_path) != entry['sha256']:
+                bad.append(name)
+        return bad
+
+    def gc(self, keep: Optional[int] = None):
+        """Delete old generations, always keeping the current one and the newest `keep`."""
+        keep = self.keep if keep is None else keep
+        current = self.current()
+        generations = self.generations()
+        for generation in generations[:-keep] if keep else generations:
+            if generation != current:
+                shutil.rmtree(self.path(generation), ignore_errors=True)
+                logger.info(f"🗑️  Removed old snapshot {generation}")
+        # Leftovers of interrupted builds (recent ones may still be in progress)
+        for name in os.listdir(self.root):
+            staging = os.path.join(self.root, name)
+            if name.endswith(".tmp") and os.path.isdir(staging) \
+                    and time.time() - os.path.getmtime(staging) > _STALE_STAGING_S:
+                shutil.rmtree(staging, ignore_errors=True)
+
+    # --- Export / import ---
+
+    def export(self, out_path: str, config: Dict[str, Any], generation: Optional[str] = None,
+               with_db: bool = False, db_path: Optional[str] = None):
+        """Pack a generation (plus the stored text it references) into one .tar.gz artifact."""
+        generation = generation or self.current()
+        if generation is None:
+            raise RuntimeError("No snapshot generation to export")
+        bad = self.verify(generation)
+        if bad:
+            raise RuntimeError(f"Snapshot {generation} failed verification: {bad}")
+
+        with tarfile.open(out_path, "w:gz") as tar:
+            tar.add(self.path(generation), arcname="generation")
+
+            # Chunk text referenced by the maps (one per shard) lives in the document store
+            text_refs = set()
+            map_name = config['vector']['chunks_map_file']
+            for name in self.manifest(generation)['files']:
+                if os.path.basename(name) == map_name:
+                    with open(self.path(generation, name), 'r', encoding='utf-8') as f:
+                        text_refs.update(meta['text_ref'] for meta in json.load(f).values() if 'text_ref' in meta)
+            store_dir = os.path.join(config['data']['output_dir'], config.get('store', {}).get('dir', "store"))
+            for digest in sorted(text_refs):
+                tar.add(os.path.join(store_dir, "blobs", digest[:2], f"{digest}.txt"),
+                        arcname=f"store/{digest[:2]}/{digest}.txt")
+
+            if with_db and db_path and os.path.exists(db_path):
+                with tempfile.TemporaryDirectory() as tmp:
+                    backup_path = os.path.join(tmp, "user_library.db")
+                    source, target = sqlite3.connect(db_path), sqlite3.connect(backup_path)
+                    source.backup(target)
+                    source.close()
+                    target.close()
+                    tar.add(backup_path, arcname="user_library.db")
+
+            note = json.dumps({"generation": generation, "text_blobs": len(text_refs)}).encode()
+            info = tarfile.TarInfo("export.json")
+            info.size = len(note)
+            tar.addfile(info, io.BytesIO(note))
+        logger.success(f"📦 Exported {generation} to {out_path}")
+
+    def import_(self, archive_path: str, config: Dict[str, Any], db_path: Optional[str] = None) -> str:
+        """Unpack an exported snapshot as a new generation, verify it and make it current."""
+        data_dir = config['data']['output_dir']
+        generation, staging = self.begin()
+        try:
+            with tempfile.TemporaryDirectory(dir=self.root) as tmp:
+                with tarfile.open(archive_path, "r:gz") as tar:
+                    _extract_archive(tar, tmp)
+
+                for name in os.listdir(os.path.join(tmp, "generation")):
+                    if name != MANIFEST:
+                        shutil.move(os.path.join(tmp, "generation", name), os.path.join(staging, name))
+                manifest = json.load(open(os.path.join(tmp, "generation", MANIFEST), encoding='utf-8'))
+                for name, entry in manifest['files'].items():
+                    if _sha256(os.path.join(staging, name)) != entry['sha256']:
+                        raise RuntimeError(f"Checksum mismatch for {name}")
+
+                # Stored text blobs (content-addressed, so existing ones are identical)
+                store_blobs = os.path.join(data_dir, config.get('store', {}).get('dir', "store"), "blobs")
+                store_src = os.path.join(tmp, "store")
+                if os.path.isdir(store_src):
+                    for prefix in os.listdir(store_src):
+                        os.makedirs(os.path.join(store_blobs, prefix), exist_ok=True)
+                        for blob in os.listdir(os.path.join(store_src, prefix)):
+                            target = os.path.join(store_blobs, prefix, blob)
+                            if not os.path.exists(target):
+                                shutil.move(os.path.join(store_src, prefix, blob), target)
+
+                db_backup = os.path.join(tmp, "user_library.db")
+                if db_path and os.path.exists(db_backup) and not os.path.exists(db_path):
+                    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+                    shutil.move(db_backup, db_path)
+                    logger.info(f"💾 Restored user database to {db_path}")
+
+            info = {k: v for k, v in manifest.items() if k not in ("generation", "created_at", "files")}
+            self.commit(generation, staging, {**info, "imported_from": manifest['generation']})
+        except Exception:
+            self.abort(staging)
+            raise
+
+        install_corpus_files(self.path(generation), config)
+        return generation
+
+
+def install_corpus_files(generation_dir: str, config: Dict[str, Any]):
+    """Copy the generation's metadata and context packs to the paths the API reads."""
+    data_dir = config['data']['output_dir']
+    packs_file = config['parser'].get('context_packs', {}).get('output_file', "context_packs.json")
+    for name in (config['data']['metadata_file'], packs_file):
+        source = os.path.join(generation_dir, name)
+        if os.path.exists(source):
+            temp_path = os.path.join(data_dir, f"{name}.tmp")
+            shutil.copyfile(source, temp_path)
+            os.replace(temp_path, os.path.join(data_dir, name))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage corpus snapshot generations")
+    parser.add_argument("--config", default="config.yaml")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    sub.add_parser("gc")
+    export_cmd = sub.add_parser("export")
+    export_cmd.add_argument("output")
+    export_cmd.add_argument("--generation")
+    export_cmd.add_argument("--with-db", action="store_true", help="Include the user library SQLite DB")
+    import_cmd = sub.add_parser("import")
+    import_cmd.add_argument("archive")
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    manager = SnapshotManager.from_config(config)
+    db_path = os.path.join(config['data']['output_dir'], "user_library.db")
+
+    if args.command == "list":
+        current = manager.current()
+        for generation in manager.generations():
+            manifest = manager.manifest(generation)
+            marker = "*" if generation == current else " "
+            print(f"{marker} {generation}  {manifest['created_at']}  vectors={manifest.get('vectors', '?')}  "
+                  f"papers={manifest.get('papers', '?')}")
+    elif args.command == "gc":
+        manager.gc()
+    elif args.command == "export":
+        manager.export(args.output, config, args.generation, with_db=args.with_db, db_path=db_path)
+    elif args.command == "import":
+        manager.import_(args.archive, config, db_path=db_path)
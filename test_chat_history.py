@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import database
+
+
+def test_cap_only_trims_summarized_turns():
+    original_path = database.DB_PATH
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_PATH = os.path.join(tmp, "library.db")
+            database.init_db()
+            total = database.MAX_HISTORY + 10
+
+            # No summary yet (e.g. the LLM is down): nothing may be dropped
+            for i in range(total):
+                database.add_chat_message("p1", "user", f"turn {i}", only_summarized=True)
+            assert len(database.get_chat_history("p1")) == total
+
+            # Once the first 15 turns are summarized, only those can go
+            first_ids = [m['id'] for m in database.get_chat_memory("p1")['messages']]
+            database.save_chat_summary("p1", "summary", covers_until=first_ids[14])
+            database.add_chat_message("p1", "user", "newest", only_summarized=True)
+            history = database.get_chat_history("p1")
+            assert len(history) == database.MAX_HISTORY
+            assert history[0]['content'] == "turn 11" and history[-1]['content'] == "newest"
+
+            # Turns 11-14 are the last summarized ones; after them the history grows past the cap
+            for i in range(5):
+                database.add_chat_message("p1", "user", f"later {i}", only_summarized=True)
+            history = database.get_chat_history("p1")
+            assert history[0]['content'] == "turn 15"
+            assert len(history) == database.MAX_HISTORY + 1
+
+            # Without memory the plain cap applies
+            for i in range(total):
+                database.add_chat_message("p2", "user", f"turn {i}")
+            assert len(database.get_chat_history("p2")) == database.MAX_HISTORY
+    finally:
+        database.DB_PATH = original_path
+
+
+if __name__ == "__main__":
+    test_cap_only_trims_summarized_turns()
+    print("✅ Chat history cap keeps unsummarized turns")
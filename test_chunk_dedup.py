@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import zlib
+import tempfile
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from chunk_dedup import ChunkDeduplicator
+from agents.vector_agent import VectorAgent
+
+
+def test_wordless_chunks_are_never_deduplicated():
+    dedup = ChunkDeduplicator()
+    assert dedup.signature("— · — ∑ ≤ §") is None
+    assert dedup.signature("") is None
+
+    chunks = [("a", "∑ ≤ ∑"), ("b", "— · —"), ("c", "   "), ("d", "§ §")]
+    result = dedup.dedup(chunks)
+    assert sorted(result.kept) == [0, 1, 2, 3]
+    assert result.aliases == {} and result.boilerplate == 0
+
+
+def test_near_duplicates_still_collapse():
+    text = "multi agent systems coordinate language model agents through shared memory and tools"
+    result = ChunkDeduplicator().dedup([("a", text), ("b", text + "."), ("c", "∑ ≤ ∑")])
+    assert sorted(result.kept) == [0, 2]
+    assert result.aliases == {0: [1]}
+
+
+class _BagOfWordsModel:
+    """Deterministic stand-in for the sentence-transformers model."""
+    def encode(self, texts, batch_size=32, show_progress_bar=False, **kwargs):
+        vectors = np.zeros((len(texts), 32), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % 32] += 1
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+
+def test_dedup_runs_across_shards():
+    boilerplate = "this work was supported by a grant from the national science foundation of nowhere"
+    shared = "multi agent systems coordinate language model agents through shared memory and tools"
+    categories = ["cs.AI", "cs.IR", "cs.CL", "cs.LG", "cs.MA", "stat.ML"]
+    papers = [{"id": f"2401.{i:05d}", "title": f"Paper {i}", "primary_category": category,
+               "published": "2024-01-01", "chunks": [boilerplate, f"unique findings of paper number {i} " * 3]}
+              for i, category in enumerate(categories)]
+    papers[0]['chunks'].append(shared)
+    papers[1]['chunks'].append(shared + ".")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml"), 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+        config['data']['output_dir'] = tmp
+        config['store']['enabled'] = config['snapshots']['enabled'] = False
+        config['vector']['related']['enabled'] = False
+        config['vector']['sharding']['by'] = "category_month"  # One paper per shard
+        config_path = os.path.join(tmp, "config.yaml")
+        with open(config_path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(config, f)
+        with open(os.path.join(tmp, config['parser']['output_file']), 'w', encoding='utf-8') as f:
+            json.dump(papers, f)
+
+        agent = VectorAgent(config_path, use_retrieval_service=False)
+        agent._model = _BagOfWordsModel()
+        agent.create_index()
+
+        # Boilerplate spans six shards of one paper each and is still dropped everywhere
+        layout = agent._load_index()
+        texts = [meta['text'] for entry in layout['shards'].values() for meta in entry['map'].values()]
+        assert boilerplate not in texts and len(texts) == len(papers) + 1
+
+        # The duplicate is stored once, in the first paper's shard, and still found for the second paper
+        assert layout['alias_shards'] == {"2401.00001": [layout['papers']["2401.00000"]]}
+        query = agent._model.encode([shared])
+        results = agent.search_by_vector(query, paper_id="2401.00001", top_k=2)
+        assert results[0]['text'] == shared and results[0]['paper_title'] == "Paper 1"
+
+
+if __name__ == "__main__":
+    test_wordless_chunks_are_never_deduplicated()
+    test_near_duplicates_still_collapse()
+    test_dedup_runs_across_shards()
+    print("✅ Chunk dedup keeps wordless chunks and collapses near-duplicates across shards")
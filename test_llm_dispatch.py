@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from llm_dispatch import _ModelGate
+
+
+def test_freed_slots_admit_every_queued_caller():
+    gate = _ModelGate(limit=2, max_queue=8)
+    gate.acquire("m", 0, 0)
+    gate.acquire("m", 0, 1)
+
+    running, peak = [], [0]
+    lock = threading.Lock()
+    finish = threading.Event()
+
+    def caller(seq):
+        gate.acquire("m", 1, seq)
+        with lock:
+            running.append(seq)
+            peak[0] = max(peak[0], len(running))
+        finish.wait(5)
+        with lock:
+            running.remove(seq)
+        gate.release(0.0)
+
+    # The head of the queue (lowest seq) starts waiting last, so it is woken last
+    threads = [threading.Thread(target=caller, args=(seq,)) for seq in (4, 3, 2)]
+    for thread in threads:
+        thread.start()
+        while len(gate.waiting) < threads.index(thread) + 1:
+            time.sleep(0.01)
+        time.sleep(0.05)
+
+    # Both slots free up at once while three callers are queued: two of them must run together
+    with gate.cond:
+        gate.release(0.0)
+        gate.release(0.0)
+    deadline = time.monotonic() + 2
+    while peak[0] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    finish.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert peak[0] == 2
+
+
+if __name__ == "__main__":
+    test_freed_slots_admit_every_queued_caller()
+    print("✅ Model gate admits a queued caller per free slot")
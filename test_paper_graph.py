@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from paper_graph import PaperGraph
+
+
+def _centroids(ids, dim: int, seed: int):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(len(ids), dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return dict(zip(ids, vectors))
+
+
+def test_update_rebuilds_when_the_embedding_dimension_changes():
+    ids = [f"2401.{i:05d}" for i in range(6)]
+    titles = {pid: f"Paper {pid}" for pid in ids}
+    with tempfile.TemporaryDirectory() as tmp:
+        graph = PaperGraph(k=3)
+        graph.update(_centroids(ids, 8, seed=0), titles)
+        graph.save(tmp)
+
+        # A new embedding model re-embeds the corpus with a different width
+        loaded = PaperGraph.load(tmp, k=3)
+        assert loaded.centroids.shape == (6, 8)
+        stats = loaded.update(_centroids(ids, 16, seed=1), titles)
+
+        assert stats["recomputed"] == stats["changed"] == stats["papers"] == 6
+        assert loaded.centroids.shape == (6, 16)
+        assert all(len(loaded.neighbors[pid]) == 3 for pid in ids)
+
+
+if __name__ == "__main__":
+    test_update_rebuilds_when_the_embedding_dimension_changes()
+    print("✅ Paper graph rebuilds on a new embedding dimension")
@@ -1,6 +1,9 @@
-from src.agents.parser_agent import ParserAgent
-import json
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from agents.parser_agent import ParserAgent
+import json
 
 def main():
     print("=== Testing Parser Agent ===")
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from agents import scraper_agent
+from agents.scraper_agent import ScraperAgent
+
+NOW = datetime(2026, 1, 10, tzinfo=timezone.utc)
+
+
+class _Author:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _Result:
+    def __init__(self, day: int):
+        self.published = NOW - timedelta(days=day)
+        self.title = f"Paper from day {day}"
+        self.summary = "An abstract."
+        self.primary_category = "cs.AI"
+        self.pdf_url = f"https://arxiv.org/pdf/2601.{day:05d}"
+        self.authors = [_Author("A. Author")]
+        self._id = f"2601.{day:05d}"
+
+    def get_short_id(self) -> str:
+        return self._id
+
+
+class _StubClient:
+    """Serves `feed` newest-first, one page per `results(search, offset)` call."""
+    def __init__(self, feed, pages):
+        self.feed = feed
+        self.pages = pages
+
+    def results(self, search, offset=0):
+        self.pages.append(offset)
+        ordered = sorted(self.feed, key=lambda r: r.published, reverse=True)
+        return iter(ordered[offset:search.max_results])
+
+
+def _make_agent(tmp: str, feed, pages, downloads, limiter_calls):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml"), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['data']['output_dir'] = tmp
+    config['scraper'].update(keywords=["agents"], max_results=10, page_size=3, api_interval=0, max_workers=1)
+    config_path = os.path.join(tmp, "config.yaml")
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+
+    agent = ScraperAgent(config_path, client_factory=lambda: _StubClient(feed, pages))
+    agent.download_pdf = lambda url, filename: downloads.append(filename) or True
+    wait = agent.api_limiter.wait
+    agent.api_limiter.wait = lambda: limiter_calls.append(1) or wait()
+    return agent
+
+
+def _mark(tmp: str):
+    path = os.path.join(tmp, "scraper_state.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get("agents")
+
+
+def test_incremental_harvest_honours_the_high_water_mark():
+    upserted = []
+    original_upsert = scraper_agent.upsert_papers
+    scraper_agent.upsert_papers = lambda papers: upserted.extend(papers) or len(papers)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            feed = [_Result(day) for day in range(1, 6)]
+
+            # First run: everything is new, one limiter wait per page request
+            pages, downloads, waits = [], [], []
+            _make_agent(tmp, feed, pages, downloads, waits).run()
+            assert len(downloads) == 5 and len(upserted) == 5
+            assert len(waits) == len(pages) == 2
+            assert _mark(tmp) == feed[0].published.isoformat()
+
+            # Second run: stops at the mark on the first page, nothing new is fetched
+            pages, downloads, waits = [], [], []
+            _make_agent(tmp, feed, pages, downloads, waits).run()
+            assert downloads == [] and len(upserted) == 5
+            assert pages == [0] and len(waits) == 1
+            assert _mark(tmp) == feed[0].published.isoformat()
+
+            # A newer paper whose metadata cannot be written: the mark stays put
+            feed.append(_Result(0))
+            pages, downloads, waits = [], [], []
+            agent = _make_agent(tmp, feed, pages, downloads, waits)
+            agent._save_metadata = lambda papers: False
+            agent.run()
+            assert downloads == ["2601.00000.pdf"] and len(upserted) == 5
+            assert _mark(tmp) == feed[0].published.isoformat()
+
+            # Once it is written, the mark advances to it
+            pages, downloads, waits = [], [], []
+            _make_agent(tmp, feed, pages, downloads, waits).run()
+            assert downloads == ["2601.00000.pdf"] and len(upserted) == 6
+            assert _mark(tmp) == NOW.isoformat()
+    finally:
+        scraper_agent.upsert_papers = original_upsert
+
+
+if __name__ == "__main__":
+    test_incremental_harvest_honours_the_high_water_mark()
+    print("✅ Incremental harvest honours the high-water mark")
@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import database
+
+
+def _paper(i: int, title: str, summary: str, category: str = "cs.AI") -> dict:
+    return {"id": f"2401.{i:05d}", "title": title, "summary": summary, "authors": ["A. Author"],
+            "primary_category": category, "published": "2024-01-01", "pdf_url": ""}
+
+
+def _with_temp_db(test):
+    original_path = database.DB_PATH
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_PATH = os.path.join(tmp, "library.db")
+            database._local.search_conn = None
+            database.init_db()
+            test()
+    finally:
+        if getattr(database._local, "search_conn", None) is not None:
+            database._local.search_conn.close()
+        database._local.search_conn = None
+        database.DB_PATH = original_path
+
+
+def test_best_match_ranks_first_regardless_of_insertion_order():
+    def check():
+        # The best match is inserted more than 500 rows before the weaker ones
+        database.upsert_papers([_paper(0, "Retrieval augmented generation", "Retrieval augmented generation.")])
+        database.upsert_papers([_paper(i, f"Agent study {i}", "We mention retrieval once.")
+                                for i in range(1, 701)])
+
+        results = database.search_papers("retrieval ", limit=5)
+        assert results[0]['id'] == "2401.00000"
+        assert len(database.search_papers("retrieval ", limit=20, offset=600)) == 20
+        assert len(database.search_papers("retrieval ", limit=20, offset=690)) == 11
+
+    _with_temp_db(check)
+
+
+def test_category_filter_is_exact():
+    def check():
+        database.upsert_papers([_paper(1, "Agents for retrieval", "Retrieval.", "cs.AI"),
+                                _paper(2, "Retrieval at scale", "Retrieval.", "cs.IR"),
+                                _paper(3, "Retrieval in physics", "Retrieval.", "physics.data-an")])
+
+        assert [r['id'] for r in database.search_papers("retrieval", category="cs.AI")] == ["2401.00001"]
+        assert database.search_papers("retrieval", category="cs") == []
+        assert len(database.search_papers("retrieval")) == 3
+        # The filter applies before the page is cut
+        assert [r['id'] for r in database.search_papers("retrieval", limit=1, category="cs.IR")] == ["2401.00002"]
+
+    _with_temp_db(check)
+
+
+if __name__ == "__main__":
+    test_best_match_ranks_first_regardless_of_insertion_order()
+    test_category_filter_is_exact()
+    print("✅ Search ranks every match and filters categories exactly")
@@ -1,5 +1,10 @@
-from src.agents.vector_agent import VectorAgent
 import os
+import sys
+
+# Modules under src/ import each other by top-level name (as when run via api.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from agents.vector_agent import VectorAgent
 
 def main():
     print("=== Testing Vector Agent ===")